@@ -6,7 +6,11 @@ import google.generativeai as genai
 from dotenv import load_dotenv
 
 from src.models import db, User
+from src.migrations import run_migrations
 from routes import routes as main_routes  
+from routes.utils import session_store
+from routes.utils.session_store import SqliteSessionBackend, MemorySessionBackend
+from routes.utils import admission
 
 # Configuração de upload
 UPLOAD_FOLDER = 'static/uploads/avatars'
@@ -23,11 +27,37 @@ def create_app():
     app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
     app.config['UPLOAD_FOLDER'] = UPLOAD_FOLDER
     app.config['MAX_CONTENT_LENGTH'] = 5 * 1024 * 1024  # 5MB
+    app.config['SESSION_BACKEND'] = os.getenv('SESSION_BACKEND', 'sqlite')  # 'sqlite' ou 'memory'
+    app.config['UNCERTAINTY_MODE'] = os.getenv('UNCERTAINTY_MODE', 'false').lower() == 'true'
+    
+    # Limites das rotas que chamam a IA
+    app.config['ADMISSION_BACKEND'] = os.getenv('ADMISSION_BACKEND', 'sqlite')  # 'sqlite' ou 'memory'
+    app.config['LLM_RATE_CAPACITY'] = int(os.getenv('LLM_RATE_CAPACITY', 10))      # rajada por usuário
+    app.config['LLM_RATE_PER_MINUTE'] = float(os.getenv('LLM_RATE_PER_MINUTE', 6)) # reposição por usuário
+    app.config['LLM_MAX_CONCURRENT'] = int(os.getenv('LLM_MAX_CONCURRENT', 4))     # chamadas simultâneas (global)
+    app.config['LLM_MAX_QUEUE'] = int(os.getenv('LLM_MAX_QUEUE', 8))               # espera por worker
+    app.config['LLM_MAX_WAIT'] = float(os.getenv('LLM_MAX_WAIT', 10))              # segundos na fila
     
     # IMPORTANTE: Criar pasta de uploads se não existir
     os.makedirs(UPLOAD_FOLDER, exist_ok=True)
     print(f"✅ Pasta de uploads criada/verificada: {UPLOAD_FOLDER}")
     
+    # Sessões no servidor: o cookie carrega apenas o id da sessão
+    if app.config['SESSION_BACKEND'] == 'memory':
+        session_backend = MemorySessionBackend()
+    else:
+        os.makedirs(app.instance_path, exist_ok=True)
+        session_backend = SqliteSessionBackend(os.path.join(app.instance_path, 'sessions.db'))
+    session_store.init_app(app, session_backend)
+    
+    # Controle de admissão: estado compartilhado entre workers
+    if app.config['ADMISSION_BACKEND'] == 'memory':
+        admission_backend = admission.MemoryAdmissionBackend()
+    else:
+        os.makedirs(app.instance_path, exist_ok=True)
+        admission_backend = admission.SqliteAdmissionBackend(os.path.join(app.instance_path, 'admission.db'))
+    admission.init_app(app, admission_backend)
+    
     CORS(app)
     
     # Inicializar banco de dados
@@ -60,6 +90,7 @@ def create_app():
     # Criar tabelas do banco de dados
     with app.app_context():
         db.create_all()
+        run_migrations(db)
         print("✅ Banco de dados inicializado!")
     
     return app
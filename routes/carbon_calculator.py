@@ -1,3 +1,5 @@
+import numpy as np
+
 EMISSION_FACTORS = {
     "gasolina": 0.231,  
     "etanol": 0.095,   
@@ -8,15 +10,55 @@ EMISSION_FACTORS = {
     "gas_glp": 3.01,      
 }
 
-def calculate_footprint(data):
+FUELS = ("gasolina", "etanol", "diesel")
+
+FUEL_ALIASES = {
+    "álcool": "etanol",
+    "alcool": "etanol",
+}
+
+
+def normalize_fuel(fuel):
+    """Nome do combustível com chave em EMISSION_FACTORS, ou None se desconhecido"""
+    if not fuel:
+        return None
+    fuel = str(fuel).strip().lower()
+    fuel = FUEL_ALIASES.get(fuel, fuel)
+    return fuel if fuel in FUELS else None
+
+
+# Incerteza relativa (desvio padrão / média) de cada fator de emissão
+EMISSION_FACTOR_UNCERTAINTY = {
+    "gasolina": 0.10,
+    "etanol": 0.30,
+    "diesel": 0.10,
+    "onibus_urbano": 0.25,
+
+    "eletricidade": 0.35,
+    "gas_glp": 0.05,
+}
+
+# Incerteza relativa dos valores informados pelo usuário
+INPUT_UNCERTAINTY = {
+    "km_carro": 0.20,
+    "km_onibus": 0.30,
+    "kwh_eletricidade": 0.10,
+    "kg_gas_glp": 0.15,
+}
+
+PERCENTILES = (5, 50, 95)
+
+
+def calculate_footprint(data, uncertainty=False, samples=100_000, seed=None):
     emissions = {
         "transporte": 0.0,
         "energia_eletrica": 0.0,
         "gas_cozinha": 0.0,
     }
 
-    if data.get("km_carro") and data.get("tipo_combustivel"):
-        fuel_factor = EMISSION_FACTORS.get(data["tipo_combustivel"], 0)
+    fuel = normalize_fuel(data.get("tipo_combustivel"))
+    if data.get("km_carro") and fuel:
+        fuel_factor = EMISSION_FACTORS[fuel]
         emissions["transporte"] += data["km_carro"] * fuel_factor
         
     if data.get("km_onibus"):
@@ -30,7 +72,48 @@ def calculate_footprint(data):
 
     total_emissions = sum(emissions.values())
 
-    return {
+    results = {
         "details_kg_co2e": {k: round(v, 2) for k, v in emissions.items()},
         "total_kg_co2e": round(total_emissions, 2)
-    }
\ No newline at end of file
+    }
+
+    if uncertainty:
+        results["uncertainty"] = simulate_uncertainty(data, samples=samples, seed=seed)
+
+    return results
+
+
+def _lognormal(rng, mean, rel_std, samples):
+    """Amostras lognormais com a média e o desvio relativo informados"""
+    if not mean:
+        return np.zeros(samples, dtype=np.float32)
+    sigma2 = np.log1p(rel_std ** 2)
+    mu = np.log(mean) - sigma2 / 2
+    return rng.lognormal(mu, np.sqrt(sigma2), samples).astype(np.float32)
+
+
+def simulate_uncertainty(data, samples=100_000, seed=None):
+    """Monte Carlo sobre fatores e entradas; retorna p5/p50/p95 por categoria e total"""
+    rng = np.random.default_rng(seed)
+
+    def term(input_key, factor_key):
+        value = data.get(input_key) or 0
+        factor = EMISSION_FACTORS.get(factor_key, 0) if factor_key else 0
+        if not value or not factor:
+            return np.zeros(samples, dtype=np.float32)
+        return (_lognormal(rng, value, INPUT_UNCERTAINTY[input_key], samples)
+                * _lognormal(rng, factor, EMISSION_FACTOR_UNCERTAINTY[factor_key], samples))
+
+    fuel = normalize_fuel(data.get("tipo_combustivel")) if data.get("km_carro") else None
+    draws = {
+        "transporte": term("km_carro", fuel) + term("km_onibus", "onibus_urbano"),
+        "energia_eletrica": term("kwh_eletricidade", "eletricidade"),
+        "gas_cozinha": term("kg_gas_glp", "gas_glp"),
+    }
+    draws["total"] = draws["transporte"] + draws["energia_eletrica"] + draws["gas_cozinha"]
+
+    p = np.percentile(np.stack(list(draws.values())), PERCENTILES, axis=1)
+    return {
+        category: {f"p{q}": round(float(v), 2) for q, v in zip(PERCENTILES, p[:, i])}
+        for i, category in enumerate(draws)
+    }
@@ -7,6 +7,7 @@ from flask_login import login_required, current_user
 import google.generativeai as genai
 from routes import routes
 from routes.utils.ai_helper import generate_ai_response, SYSTEM_PROMPT
+from routes.utils.admission import AdmissionRejected, admitted, too_many
 
 # Histórico global de conversas
 conversation_history = []
@@ -49,10 +50,15 @@ def send_message():
         return jsonify({"error": "Mensagem inválida"}), 400
 
     user_text = message['text']
-    conversation_history.append({'role': 'user', 'parts': [user_text]})
 
-    # Gerar resposta com retry automático
-    response_text = generate_ai_response(conversation_history)
+    # Admissão só depois de validar: requisição malformada não gasta token
+    try:
+        with admitted('llm'):
+            conversation_history.append({'role': 'user', 'parts': [user_text]})
+            # Gerar resposta com retry automático
+            response_text = generate_ai_response(conversation_history)
+    except AdmissionRejected as e:
+        return too_many(e)
     
     if response_text:
         conversation_history.append({'role': 'model', 'parts': [response_text]})
@@ -2,93 +2,171 @@
 Microsserviço de Relatórios
 Responsável por: geração, visualização, histórico e exclusão de relatórios
 """
-from flask import render_template, request, jsonify, session, redirect, url_for
+from flask import render_template, request, jsonify, session, redirect, url_for, current_app, make_response
 from flask_login import login_required, current_user
 import json
+import uuid
+from datetime import timezone
+import numpy as np
 from src.models import db, Report
 from routes import routes, carbon_calculator
 from routes.utils.data_extraction import extract_data_from_conversation
 from routes.utils.ai_helper import generate_report_text
+from routes.utils import leaderboard, idempotency
+from routes.utils.admission import AdmissionRejected, admitted
 
 
-@routes.route("/generate_report", methods=['POST'])
-@login_required
-def generate_report():
-    """Gera relatório de pegada de carbono"""
-    from routes.chat_routes import conversation_history
+def build_report_data(report):
+    """Monta os dados de exibição a partir de um Report salvo"""
+    return {
+        "data_for_dashboard": {
+            'details_kg_co2e': {
+                'transporte': report.transporte_kg_co2e,
+                'energia_eletrica': report.energia_eletrica_kg_co2e,
+                'gas_cozinha': report.gas_cozinha_kg_co2e
+            },
+            'total_kg_co2e': report.total_kg_co2e,
+            'uncertainty': report.uncertainty
+        },
+        "narrative_report": report.narrative_report,
+        "report_id": report.id
+    }
+
+
+def uncertainty_requested():
+    """Modo incerteza: campo 'uncertainty' do formulário/JSON ou padrão da aplicação"""
+    payload = request.get_json(silent=True) or {}
+    value = payload.get('uncertainty', request.form.get('uncertainty'))
+    if value is None:
+        return current_app.config.get('UNCERTAINTY_MODE', False)
+    return str(value).lower() in ('1', 'true', 'on', 'sim')
+
+
+def save_report(input_data, calculation_results, text_report):
+    """Grava o relatório e atualiza os rankings da equipe"""
+    new_report = Report(
+        user_id=current_user.id,
+        km_carro=input_data.get('km_carro'),
+        tipo_combustivel=input_data.get('tipo_combustivel'),
+        km_onibus=input_data.get('km_onibus'),
+        kwh_eletricidade=input_data.get('kwh_eletricidade'),
+        kg_gas_glp=input_data.get('kg_gas_glp'),
+        total_kg_co2e=calculation_results['total_kg_co2e'],
+        transporte_kg_co2e=calculation_results['details_kg_co2e']['transporte'],
+        energia_eletrica_kg_co2e=calculation_results['details_kg_co2e']['energia_eletrica'],
+        gas_cozinha_kg_co2e=calculation_results['details_kg_co2e']['gas_cozinha'],
+        uncertainty=calculation_results.get('uncertainty'),
+        narrative_report=text_report
+    )
     
+    db.session.add(new_report)
+    db.session.flush()
+    leaderboard.record_report(new_report, current_user)
+    db.session.commit()
+    return new_report
+
+
+def run_report_pipeline(conversation_history, uncertainty):
+    """Extração -> cálculo -> narrativa -> banco; retorna (payload, status)"""
     print("\n=== INICIANDO GERAÇÃO DE RELATÓRIO ===")
     
     # Extrair dados da conversa
     extracted_data = extract_data_from_conversation(conversation_history)
     if not extracted_data:
-        return jsonify({
+        return {
             "error": "Não consegui processar os dados. Use a Calculadora Manual.",
             "redirect": url_for('main.show_calculator_form')
-        }), 500
+        }, 500
     
     print(f"📊 Dados extraídos: {extracted_data}")
     
     # Calcular pegada de carbono
     try:
-        calculation_results = carbon_calculator.calculate_footprint(extracted_data)
+        calculation_results = carbon_calculator.calculate_footprint(
+            extracted_data, uncertainty=uncertainty
+        )
         print(f"✅ Cálculo: {calculation_results['total_kg_co2e']} kg CO2e")
     except Exception as e:
         print(f"❌ Erro no cálculo: {e}")
-        return jsonify({"error": "Erro ao calcular"}), 500
+        return {"error": "Erro ao calcular"}, 500
     
     # Gerar relatório narrativo
     text_report = generate_report_text(calculation_results)
     
     # Salvar no banco
     try:
-        new_report = Report(
-            user_id=current_user.id,
-            km_carro=extracted_data.get('km_carro'),
-            tipo_combustivel=extracted_data.get('tipo_combustivel'),
-            km_onibus=extracted_data.get('km_onibus'),
-            kwh_eletricidade=extracted_data.get('kwh_eletricidade'),
-            kg_gas_glp=extracted_data.get('kg_gas_glp'),
-            total_kg_co2e=calculation_results['total_kg_co2e'],
-            transporte_kg_co2e=calculation_results['details_kg_co2e']['transporte'],
-            energia_eletrica_kg_co2e=calculation_results['details_kg_co2e']['energia_eletrica'],
-            gas_cozinha_kg_co2e=calculation_results['details_kg_co2e']['gas_cozinha'],
-            narrative_report=text_report
-        )
-        
-        db.session.add(new_report)
-        db.session.commit()
-        
+        new_report = save_report(extracted_data, calculation_results, text_report)
         print(f"✅ Relatório salvo (ID: {new_report.id})\n")
-        
     except Exception as e:
         db.session.rollback()
         print(f"❌ Erro ao salvar: {e}")
-        return jsonify({"error": "Erro ao salvar"}), 500
+        return {"error": "Erro ao salvar"}, 500
     
-    session['report_data'] = {
-        "data_for_dashboard": calculation_results,
-        "narrative_report": text_report,
+    return {
+        "status": "success",
+        "redirect_url": url_for('main.show_report'),
         "report_id": new_report.id
-    }
+    }, 200
+
+
+@routes.route("/generate_report", methods=['POST'])
+@login_required
+def generate_report():
+    """Gera relatório de pegada de carbono (cliques duplos reaproveitam a mesma execução)"""
+    from routes.chat_routes import conversation_history
+    
+    uncertainty = uncertainty_requested()
+    key = idempotency.request_key(
+        current_user.id, 'generate_report',
+        {'conversation': conversation_history, 'uncertainty': uncertainty}
+    )
+    
+    def generate():
+        # Admissão só no líder: repetições esperam/reaproveitam sem gastar token nem vaga
+        try:
+            with admitted('llm'):
+                return run_report_pipeline(list(conversation_history), uncertainty)
+        except AdmissionRejected as e:
+            return {"error": e.message, "retry_after": e.retry_after}, 429
+    
+    (payload, status), replayed = idempotency.single_flight.run(
+        key, generate, cacheable=lambda result: result[1] == 200
+    )
+    if replayed:
+        print(f"♻️ Relatório reaproveitado (ID: {payload.get('report_id')})")
     
-    return jsonify({"status": "success", "redirect_url": url_for('main.show_report')})
+    if status == 200:
+        session['report_id'] = payload['report_id']
+    
+    response = jsonify(payload)
+    response.status_code = status
+    if status == 429:
+        response.headers['Retry-After'] = str(payload['retry_after'])
+    if replayed:
+        response.headers['Idempotent-Replayed'] = 'true'
+    return response
 
 
 @routes.route("/report")
 @login_required
 def show_report():
     """Exibe relatório atual"""
-    report_data = session.get('report_data')
-    if not report_data:
+    report_id = session.get('report_id')
+    if not report_id:
+        return redirect(url_for('main.home'))
+    
+    report = Report.query.filter_by(id=report_id, user_id=current_user.id).first()
+    if not report:
+        session.pop('report_id', None)
         return redirect(url_for('main.home'))
-    return render_template("calculator.html", report_data=report_data)
+    
+    return render_template("calculator.html", report_data=build_report_data(report))
 
 
 @routes.route('/calculator')
 def show_calculator_form():
     """Exibe formulário de calculadora manual"""
-    return render_template('direct_calculator.html')
+    return render_template('direct_calculator.html', idempotency_key=uuid.uuid4().hex, form={})
 
 
 @routes.route('/calculator', methods=['POST'])
@@ -102,28 +180,38 @@ def handle_calculator_form():
         'kwh_eletricidade': request.form.get('kwh_eletricidade', type=float),
         'kg_gas_glp': (request.form.get('botijoes_gas', type=float) or 0) * 13.0
     }
+    uncertainty = uncertainty_requested()
     
-    calculation_results = carbon_calculator.calculate_footprint(sanitized_data)
-    text_report = generate_report_text(calculation_results)
+    def create_report():
+        try:
+            with admitted('llm'):
+                calculation_results = carbon_calculator.calculate_footprint(
+                    sanitized_data, uncertainty=uncertainty
+                )
+                text_report = generate_report_text(calculation_results)
+                return save_report(sanitized_data, calculation_results, text_report).id, None
+        except AdmissionRejected as e:
+            return None, e
     
-    new_report = Report(
-        user_id=current_user.id,
-        **sanitized_data,
-        total_kg_co2e=calculation_results['total_kg_co2e'],
-        transporte_kg_co2e=calculation_results['details_kg_co2e']['transporte'],
-        energia_eletrica_kg_co2e=calculation_results['details_kg_co2e']['energia_eletrica'],
-        gas_cozinha_kg_co2e=calculation_results['details_kg_co2e']['gas_cozinha'],
-        narrative_report=text_report
+    key = idempotency.request_key(
+        current_user.id, 'calculator', {**sanitized_data, 'uncertainty': uncertainty}
+    )
+    (report_id, rejected), _ = idempotency.single_flight.run(
+        key, create_report, cacheable=lambda result: result[0] is not None
     )
     
-    db.session.add(new_report)
-    db.session.commit()
+    if rejected:
+        # Volta ao formulário com os valores digitados, em vez de uma página JSON
+        response = make_response(render_template(
+            'direct_calculator.html',
+            idempotency_key=request.form.get('idempotency_key') or uuid.uuid4().hex,
+            form=request.form,
+            error=rejected.message
+        ), 429)
+        response.headers['Retry-After'] = str(rejected.retry_after)
+        return response
     
-    session['report_data'] = {
-        "data_for_dashboard": calculation_results,
-        "narrative_report": text_report,
-        "report_id": new_report.id
-    }
+    session['report_id'] = report_id
     
     return redirect(url_for('main.show_report'))
 
@@ -144,25 +232,88 @@ def get_user_reports():
     return jsonify([report.to_dict() for report in reports])
 
 
+SERIES_BUCKETS = {'day', 'week', 'month'}
+SERIES_COLUMNS = ('total', 'transporte', 'energia_eletrica', 'gas_cozinha')
+
+
+def bucket_series(timestamps, columns, bucket):
+    """Agrupa por dia/semana/mês (média) e retorna timestamps do início de cada período"""
+    days = (timestamps // 86400).astype('datetime64[D]')
+    if bucket == 'week':
+        # 01/01/1970 foi quinta-feira: recua até a segunda-feira
+        days = days - (days.astype(np.int64) + 3) % 7
+    elif bucket == 'month':
+        days = days.astype('datetime64[M]').astype('datetime64[D]')
+    keys = days.astype(np.int64)
+    
+    starts = np.flatnonzero(np.r_[True, keys[1:] != keys[:-1]])
+    counts = np.diff(np.r_[starts, keys.size])
+    means = {name: np.add.reduceat(values, starts) / counts for name, values in columns.items()}
+    return keys[starts] * 86400, means, counts
+
+
+def downsample_series(timestamps, columns, counts, points):
+    """Reduz para no máximo `points` pontos pela média de blocos consecutivos"""
+    n = timestamps.size
+    if n <= points:
+        return timestamps, columns, counts
+    starts = np.linspace(0, n, points, endpoint=False).astype(np.int64)
+    sizes = np.add.reduceat(counts, starts)
+    weighted = {
+        name: np.add.reduceat(values * counts, starts) / sizes for name, values in columns.items()
+    }
+    return timestamps[starts], weighted, sizes
+
+
+@routes.route('/api/reports/series')
+@login_required
+def get_report_series():
+    """Série temporal colunar para gráficos: timestamps, total e uma lista por categoria"""
+    points = min(max(request.args.get('points', 200, type=int), 1), 2000)
+    bucket = request.args.get('bucket')
+    if bucket and bucket not in SERIES_BUCKETS:
+        return jsonify({"error": "bucket deve ser day, week ou month"}), 400
+    
+    rows = Report.query.with_entities(
+        Report.created_at,
+        Report.total_kg_co2e,
+        Report.transporte_kg_co2e,
+        Report.energia_eletrica_kg_co2e,
+        Report.gas_cozinha_kg_co2e
+    ).filter_by(user_id=current_user.id).order_by(Report.created_at).all()
+    
+    if rows:
+        created, *values = zip(*rows)
+        timestamps = np.array([int(d.replace(tzinfo=timezone.utc).timestamp()) for d in created], dtype=np.int64)
+        # None (colunas antigas sem valor) vira NaN e depois 0
+        columns = {
+            name: np.nan_to_num(np.array(col, dtype=np.float64))
+            for name, col in zip(SERIES_COLUMNS, values)
+        }
+        counts = np.ones(timestamps.size, dtype=np.int64)
+        if bucket:
+            timestamps, columns, counts = bucket_series(timestamps, columns, bucket)
+        timestamps, columns, counts = downsample_series(timestamps, columns, counts, points)
+    else:
+        timestamps = np.array([], dtype=np.int64)
+        columns = {name: np.array([]) for name in SERIES_COLUMNS}
+        counts = np.array([], dtype=np.int64)
+    
+    return jsonify({
+        "bucket": bucket,
+        "points": int(timestamps.size),
+        "timestamps": timestamps.tolist(),
+        "count": counts.tolist(),
+        **{name: np.round(col, 2).tolist() for name, col in columns.items()}
+    })
+
+
 @routes.route('/report/<int:report_id>')
 @login_required
 def view_specific_report(report_id):
     """Visualiza relatório específico"""
     report = Report.query.filter_by(id=report_id, user_id=current_user.id).first_or_404()
-    
-    report_data = {
-        "data_for_dashboard": {
-            'details_kg_co2e': {
-                'transporte': report.transporte_kg_co2e,
-                'energia_eletrica': report.energia_eletrica_kg_co2e,
-                'gas_cozinha': report.gas_cozinha_kg_co2e
-            },
-            'total_kg_co2e': report.total_kg_co2e
-        },
-        "narrative_report": report.narrative_report
-    }
-    
-    return render_template('calculator.html', report_data=report_data)
+    return render_template('calculator.html', report_data=build_report_data(report))
 
 
 @routes.route('/report/delete/<int:report_id>', methods=['POST'])
@@ -170,6 +321,7 @@ def view_specific_report(report_id):
 def delete_report(report_id):
     """Deleta relatório"""
     report = Report.query.filter_by(id=report_id, user_id=current_user.id).first_or_404()
+    leaderboard.remove_report(report, current_user)
     db.session.delete(report)
     db.session.commit()
     return jsonify({"message": "Relatório deletado"}), 200
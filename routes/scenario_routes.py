@@ -0,0 +1,53 @@
+"""
+Microsserviço de Cenários
+Responsável por: simulações "e se...?" a partir de um relatório salvo
+"""
+from flask import request, jsonify
+from flask_login import login_required, current_user
+from src.models import Report
+from routes import routes
+from routes.scenario_simulator import simulate_scenarios, rank_scenarios, ScenarioError
+
+
+@routes.route('/api/scenarios', methods=['POST'])
+@login_required
+def simulate_report_scenarios():
+    """Simula uma grade de mudanças sobre um relatório, sem gravar no banco"""
+    payload = request.get_json(silent=True) or {}
+    
+    report_id = payload.get('report_id')
+    if not isinstance(report_id, int):
+        return jsonify({"error": "'report_id' é obrigatório"}), 400
+    
+    report = Report.query.filter_by(id=report_id, user_id=current_user.id).first_or_404()
+    baseline = {
+        'km_carro': report.km_carro,
+        'tipo_combustivel': report.tipo_combustivel,
+        'km_onibus': report.km_onibus,
+        'kwh_eletricidade': report.kwh_eletricidade,
+        'kg_gas_glp': report.kg_gas_glp
+    }
+    
+    try:
+        limit = min(max(int(payload.get('limit', 10)), 1), 100)
+        result = simulate_scenarios(
+            baseline,
+            fuels=payload.get('fuels'),
+            km_reduction=payload.get('km_reduction'),
+            km_to_bus=payload.get('km_to_bus'),
+            kwh_reduction=payload.get('kwh_reduction'),
+            fewer_cylinders=payload.get('fewer_cylinders')
+        )
+    except (ScenarioError, TypeError, ValueError) as e:
+        return jsonify({"error": str(e)}), 400
+    
+    ranking = rank_scenarios(result, limit=limit)
+    
+    return jsonify({
+        "report_id": report.id,
+        "baseline": {
+            'input_data': baseline,
+            'total_kg_co2e': result['baseline_total']
+        },
+        **ranking
+    })
@@ -0,0 +1,161 @@
+"""
+Simulador de cenários "e se...?"
+Avalia uma grade inteira de mudanças de hábito em uma única passada vetorizada
+sobre os EMISSION_FACTORS, sem gravar nada no banco
+"""
+import numpy as np
+
+from routes.carbon_calculator import EMISSION_FACTORS, normalize_fuel
+
+KG_POR_BOTIJAO = 13.0
+MAX_GRID_SIZE = 20000
+
+# Peso de "esforço" de cada alavanca, usado na fronteira de Pareto
+FUEL_SWITCH_EFFORT = 0.5
+
+
+class ScenarioError(ValueError):
+    """Parâmetros de cenário inválidos"""
+
+
+def _fractions(values, name):
+    values = [0.0] if values is None else values
+    if not isinstance(values, list) or not values:
+        raise ScenarioError(f"'{name}' deve ser uma lista de frações")
+    try:
+        arr = np.unique(np.asarray(values, dtype=float))
+    except (TypeError, ValueError):
+        raise ScenarioError(f"'{name}' deve conter apenas números")
+    if not np.isfinite(arr).all():
+        raise ScenarioError(f"'{name}' deve conter apenas números finitos")
+    if arr.min() < 0 or arr.max() > 1:
+        raise ScenarioError(f"'{name}' deve estar entre 0 e 1")
+    return arr
+
+
+def _emissions(car_km, fuel_factor, bus_km, kwh, kg_gas):
+    """kg CO2e por categoria, sem arredondamento (escalares ou arrays)"""
+    transporte = car_km * fuel_factor + bus_km * EMISSION_FACTORS['onibus_urbano']
+    energia = kwh * EMISSION_FACTORS['eletricidade']
+    gas = kg_gas * EMISSION_FACTORS['gas_glp']
+    return transporte, energia, gas
+
+
+def simulate_scenarios(baseline, fuels=None, km_reduction=None, km_to_bus=None,
+                       kwh_reduction=None, fewer_cylinders=None):
+    """Avalia todas as combinações de mudanças e retorna arrays por cenário"""
+    base_car = float(baseline.get('km_carro') or 0)
+    # Combustível ausente ou desconhecido: km de carro sem fator, na linha de base e na grade
+    base_fuel = normalize_fuel(baseline.get('tipo_combustivel'))
+    base_bus = float(baseline.get('km_onibus') or 0)
+    base_kwh = float(baseline.get('kwh_eletricidade') or 0)
+    base_kg = float(baseline.get('kg_gas_glp') or 0)
+
+    if fuels:
+        invalid = [f for f in fuels if normalize_fuel(f) is None]
+        if invalid:
+            raise ScenarioError(f"Combustível inválido: {', '.join(map(str, invalid))}")
+        fuels = list(dict.fromkeys(normalize_fuel(f) for f in fuels))
+    if not fuels or base_fuel is None:
+        fuels = [base_fuel]
+
+    km_red = _fractions(km_reduction, 'km_reduction')
+    shift = _fractions(km_to_bus, 'km_to_bus')
+    kwh_red = _fractions(kwh_reduction, 'kwh_reduction')
+    try:
+        cylinders = np.unique(np.asarray(fewer_cylinders or [0], dtype=float))
+    except (TypeError, ValueError):
+        raise ScenarioError("'fewer_cylinders' deve conter apenas números")
+    if not np.isfinite(cylinders).all():
+        raise ScenarioError("'fewer_cylinders' deve conter apenas números finitos")
+    if cylinders.min() < 0:
+        raise ScenarioError("'fewer_cylinders' não pode ser negativo")
+
+    shape = (len(fuels), km_red.size, shift.size, kwh_red.size, cylinders.size)
+    grid_size = int(np.prod(shape))
+    if grid_size > MAX_GRID_SIZE:
+        raise ScenarioError(f"Grade muito grande ({grid_size} cenários, máximo {MAX_GRID_SIZE})")
+
+    fuel_idx, red, sh, kred, cyl = (
+        axis.ravel() for axis in np.meshgrid(
+            np.arange(len(fuels)), km_red, shift, kwh_red, cylinders, indexing='ij'
+        )
+    )
+    fuel_factors = np.array([EMISSION_FACTORS[f] if f else 0.0 for f in fuels])[fuel_idx]
+
+    car_km = base_car * (1 - red)
+    bus_km = base_bus + car_km * sh
+    car_km = car_km * (1 - sh)
+    kg_gas = np.maximum(base_kg - cyl * KG_POR_BOTIJAO, 0.0)
+
+    transporte, energia, gas = _emissions(car_km, fuel_factors, bus_km,
+                                          base_kwh * (1 - kred), kg_gas)
+    total = transporte + energia + gas
+
+    # Mesma expressão, sem arredondar: o cenário "sem mudanças" economiza exatamente 0
+    base_factor = EMISSION_FACTORS[base_fuel] if base_fuel else 0.0
+    baseline_total = sum(_emissions(base_car, base_factor, base_bus, base_kwh, base_kg))
+
+    fuel_switched = np.array([f != base_fuel for f in fuels])[fuel_idx] & (base_car > 0)
+    base_cylinders = max(base_kg / KG_POR_BOTIJAO, 1.0)
+    effort = (red + sh + kred + np.minimum(cyl / base_cylinders, 1.0)
+              + FUEL_SWITCH_EFFORT * fuel_switched)
+
+    return {
+        'baseline_total': round(float(baseline_total), 2),
+        'fuels': fuels,
+        'fuel_idx': fuel_idx,
+        'km_reduction': red,
+        'km_to_bus': sh,
+        'kwh_reduction': kred,
+        'fewer_cylinders': cyl,
+        'transporte': transporte,
+        'energia_eletrica': energia,
+        'gas_cozinha': gas,
+        'total': total,
+        'savings': np.round(baseline_total - total, 2),
+        'effort': np.round(effort, 4)
+    }
+
+
+def pareto_frontier(savings, effort):
+    """Índices dos cenários não dominados (máxima economia para cada nível de esforço)"""
+    order = np.lexsort((-savings, effort))
+    best_before = np.maximum.accumulate(np.concatenate(([-np.inf], savings[order][:-1])))
+    return order[savings[order] > best_before]
+
+
+def scenario_to_dict(result, i):
+    """Converte o cenário i dos arrays em dicionário JSON"""
+    baseline_total = result['baseline_total']
+    savings = float(result['savings'][i])
+    return {
+        'changes': {
+            'tipo_combustivel': result['fuels'][result['fuel_idx'][i]],
+            'km_reduction': float(result['km_reduction'][i]),
+            'km_to_bus': float(result['km_to_bus'][i]),
+            'kwh_reduction': float(result['kwh_reduction'][i]),
+            'fewer_cylinders': float(result['fewer_cylinders'][i])
+        },
+        'details_kg_co2e': {
+            'transporte': round(float(result['transporte'][i]), 2),
+            'energia_eletrica': round(float(result['energia_eletrica'][i]), 2),
+            'gas_cozinha': round(float(result['gas_cozinha'][i]), 2)
+        },
+        'total_kg_co2e': round(float(result['total'][i]), 2),
+        'savings_kg_co2e': savings,
+        'savings_pct': round(savings / baseline_total * 100, 1) if baseline_total else 0.0,
+        'effort': float(result['effort'][i])
+    }
+
+
+def rank_scenarios(result, limit=10):
+    """Top cenários por economia e fronteira de Pareto economia x esforço"""
+    savings, effort = result['savings'], result['effort']
+    ranked = np.lexsort((effort, -savings))[:limit]
+    frontier = pareto_frontier(savings, effort)
+    return {
+        'grid_size': int(savings.size),
+        'ranked': [scenario_to_dict(result, i) for i in ranked],
+        'pareto_frontier': [scenario_to_dict(result, i) for i in frontier]
+    }
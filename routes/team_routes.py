@@ -0,0 +1,168 @@
+"""
+Microsserviço de Equipes
+Responsável por: organizações, equipes, rankings mensais e percentis
+"""
+import re
+import secrets
+from flask import request, jsonify
+from flask_login import login_required, current_user
+from src.models import db, User, Organization, Team, TeamMonthStats, new_invite_code
+from routes import routes
+from routes.utils import leaderboard
+
+
+def _month_arg():
+    """Mês da query string ('AAAA-MM'), padrão mês atual"""
+    month = request.args.get('month') or leaderboard.month_key()
+    return month if re.fullmatch(r'\d{4}-\d{2}', month) else None
+
+
+def _can_manage(organization):
+    """Dono da organização ou membro de uma de suas equipes"""
+    if organization.owner_id == current_user.id:
+        return True
+    return current_user.team is not None and current_user.team.organization_id == organization.id
+
+
+def _visible_team(team_id):
+    """Equipe da mesma organização do usuário atual (ou de uma organização que ele criou)"""
+    team = Team.query.get_or_404(team_id)
+    if not _can_manage(team.organization):
+        return None
+    return team
+
+
+@routes.route('/api/organizations', methods=['POST'])
+@login_required
+def create_organization():
+    """Cria organização"""
+    data = request.get_json(silent=True) or {}
+    name = (data.get('name') or '').strip()
+    if not name:
+        return jsonify({"error": "Nome da organização é obrigatório"}), 400
+    if Organization.query.filter_by(name=name).first():
+        return jsonify({"error": "Organização já existe"}), 400
+    
+    organization = Organization(name=name, owner_id=current_user.id)
+    db.session.add(organization)
+    db.session.commit()
+    return jsonify(organization.to_dict()), 201
+
+
+@routes.route('/api/teams', methods=['POST'])
+@login_required
+def create_team():
+    """Cria equipe em uma organização"""
+    data = request.get_json(silent=True) or {}
+    name = (data.get('name') or '').strip()
+    organization = Organization.query.get(data.get('organization_id') or 0)
+    if not name or not organization:
+        return jsonify({"error": "Nome e organização válidos são obrigatórios"}), 400
+    if not _can_manage(organization):
+        return jsonify({"error": "Acesso negado"}), 403
+    if Team.query.filter_by(organization_id=organization.id, name=name).first():
+        return jsonify({"error": "Equipe já existe nesta organização"}), 400
+    
+    team = Team(organization_id=organization.id, name=name)
+    db.session.add(team)
+    db.session.commit()
+    return jsonify({**team.to_dict(), "invite_code": team.invite_code}), 201
+
+
+@routes.route('/api/teams/<int:team_id>/join', methods=['POST'])
+@login_required
+def join_team(team_id):
+    """Entra na equipe (convite ou dono da organização), levando os agregados mensais do usuário"""
+    team = Team.query.get_or_404(team_id)
+    if current_user.team_id != team.id:
+        data = request.get_json(silent=True) or {}
+        invite_code = str(data.get('invite_code') or '')
+        invited = bool(team.invite_code) and secrets.compare_digest(invite_code.encode(), team.invite_code.encode())
+        if not invited and team.organization.owner_id != current_user.id:
+            return jsonify({"error": "Convite inválido"}), 403
+
+        try:
+            leaderboard.move_user(current_user, team.id)
+            db.session.commit()
+        except Exception as e:
+            db.session.rollback()
+            print(f"❌ Erro ao entrar na equipe: {e}")
+            return jsonify({"error": "Erro ao entrar na equipe"}), 500
+    return jsonify({"message": "Você entrou na equipe", "team": team.to_dict()}), 200
+
+
+@routes.route('/api/teams/<int:team_id>/invite')
+@login_required
+def team_invite(team_id):
+    """Código de convite da equipe (membros e dono da organização)"""
+    team = Team.query.get_or_404(team_id)
+    if current_user.team_id != team.id and team.organization.owner_id != current_user.id:
+        return jsonify({"error": "Acesso negado"}), 403
+    if not team.invite_code:
+        # Equipes criadas antes dos convites
+        team.invite_code = new_invite_code()
+        db.session.commit()
+    return jsonify({"team_id": team.id, "invite_code": team.invite_code})
+
+
+@routes.route('/api/teams/leave', methods=['POST'])
+@login_required
+def leave_team():
+    """Sai da equipe atual"""
+    if current_user.team_id is not None:
+        leaderboard.move_user(current_user, None)
+        db.session.commit()
+    return jsonify({"message": "Você saiu da equipe"}), 200
+
+
+@routes.route('/api/teams/<int:team_id>/leaderboard')
+@login_required
+def team_leaderboard(team_id):
+    """Ranking mensal da equipe (menor pegada primeiro)"""
+    team = _visible_team(team_id)
+    if team is None:
+        return jsonify({"error": "Acesso negado"}), 403
+    month = _month_arg()
+    if month is None:
+        return jsonify({"error": "Mês inválido (use AAAA-MM)"}), 400
+    
+    page = max(request.args.get('page', 1, type=int), 1)
+    per_page = min(max(request.args.get('per_page', 20, type=int), 1), 100)
+    member_count, rows = leaderboard.leaderboard_page(team.id, month, page, per_page)
+    
+    users = {}
+    if rows:
+        ids = [user_id for _, _, user_id in rows]
+        users = dict(User.query.with_entities(User.id, User.username).filter(User.id.in_(ids)).all())
+    
+    stats = db.session.get(TeamMonthStats, (team.id, month))
+    return jsonify({
+        "team": team.to_dict(),
+        "month": month,
+        "page": page,
+        "per_page": per_page,
+        "member_count": member_count,
+        "team_avg_kg_co2e": round(stats.sum_kg_co2e / stats.report_count, 2) if stats and stats.report_count else None,
+        "entries": [
+            {"rank": rank, "user_id": user_id, "username": users.get(user_id), "avg_kg_co2e": avg}
+            for rank, avg, user_id in rows
+        ]
+    })
+
+
+@routes.route('/api/teams/<int:team_id>/percentile')
+@login_required
+def team_percentile(team_id):
+    """Posição e percentil de um membro no mês"""
+    team = _visible_team(team_id)
+    if team is None:
+        return jsonify({"error": "Acesso negado"}), 403
+    month = _month_arg()
+    if month is None:
+        return jsonify({"error": "Mês inválido (use AAAA-MM)"}), 400
+    
+    user_id = request.args.get('user_id', current_user.id, type=int)
+    result = leaderboard.member_rank(team.id, month, user_id)
+    if result is None:
+        return jsonify({"error": "Sem relatórios neste mês"}), 404
+    return jsonify({"team_id": team.id, "month": month, "user_id": user_id, **result})
@@ -0,0 +1,272 @@
+"""
+Controle de admissão para endpoints que chamam a IA
+Token bucket por usuário + limite global de chamadas simultâneas, com fila de espera
+limitada e resposta 429 rápida (Retry-After). O estado fica em SQLite para valer entre workers
+"""
+import math
+import sqlite3
+import threading
+import time
+import uuid
+from contextlib import contextmanager
+
+from flask import current_app, jsonify
+from flask_login import current_user
+
+
+class MemoryAdmissionBackend:
+    """Estado em memória (testes e um único worker)"""
+
+    def __init__(self):
+        self._buckets = {}
+        self._slots = {}
+        self._lock = threading.Lock()
+
+    def take_token(self, key, capacity, refill_per_sec, now):
+        """Consome um token; retorna 0 se admitido ou os segundos até o próximo token"""
+        with self._lock:
+            tokens, updated_at = self._buckets.get(key, (capacity, now))
+            tokens = min(capacity, tokens + (now - updated_at) * refill_per_sec)
+            if tokens >= 1:
+                self._buckets[key] = (tokens - 1, now)
+                return 0.0
+            self._buckets[key] = (tokens, now)
+            return (1 - tokens) / refill_per_sec
+
+    def refund_token(self, key, capacity):
+        """Devolve um token consumido por uma requisição que não foi admitida"""
+        with self._lock:
+            if key in self._buckets:
+                tokens, updated_at = self._buckets[key]
+                self._buckets[key] = (min(capacity, tokens + 1), updated_at)
+
+    def acquire_slot(self, limit, lease, now):
+        with self._lock:
+            self._slots = {sid: exp for sid, exp in self._slots.items() if exp > now}
+            if len(self._slots) >= limit:
+                return None
+            slot_id = uuid.uuid4().hex
+            self._slots[slot_id] = now + lease
+            return slot_id
+
+    def renew_slot(self, slot_id, lease, now):
+        with self._lock:
+            if slot_id not in self._slots:
+                return False
+            self._slots[slot_id] = now + lease
+            return True
+
+    def release_slot(self, slot_id):
+        with self._lock:
+            self._slots.pop(slot_id, None)
+
+
+class SqliteAdmissionBackend:
+    """Estado compartilhado entre workers em um arquivo SQLite"""
+
+    def __init__(self, path):
+        self.path = path
+        with self._connect() as conn:
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS rate_buckets ("
+                " key TEXT PRIMARY KEY, tokens REAL NOT NULL, updated_at REAL NOT NULL)"
+            )
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS llm_slots ("
+                " id TEXT PRIMARY KEY, expires_at REAL NOT NULL)"
+            )
+
+    def _connect(self):
+        # isolation_level=None: transações explícitas com BEGIN IMMEDIATE (trava de escrita)
+        return sqlite3.connect(self.path, timeout=5, isolation_level=None)
+
+    def take_token(self, key, capacity, refill_per_sec, now):
+        conn = self._connect()
+        try:
+            conn.execute("BEGIN IMMEDIATE")
+            row = conn.execute(
+                "SELECT tokens, updated_at FROM rate_buckets WHERE key = ?", (key,)
+            ).fetchone()
+            tokens, updated_at = row if row else (capacity, now)
+            tokens = min(capacity, tokens + max(now - updated_at, 0) * refill_per_sec)
+            wait = 0.0
+            if tokens >= 1:
+                tokens -= 1
+            else:
+                wait = (1 - tokens) / refill_per_sec
+            conn.execute(
+                "INSERT OR REPLACE INTO rate_buckets (key, tokens, updated_at) VALUES (?, ?, ?)",
+                (key, tokens, now)
+            )
+            conn.execute("COMMIT")
+            return wait
+        finally:
+            conn.close()
+
+    def refund_token(self, key, capacity):
+        conn = self._connect()
+        try:
+            conn.execute(
+                "UPDATE rate_buckets SET tokens = MIN(tokens + 1, ?) WHERE key = ?", (capacity, key)
+            )
+        finally:
+            conn.close()
+
+    def acquire_slot(self, limit, lease, now):
+        conn = self._connect()
+        try:
+            conn.execute("BEGIN IMMEDIATE")
+            conn.execute("DELETE FROM llm_slots WHERE expires_at <= ?", (now,))
+            in_flight = conn.execute("SELECT COUNT(*) FROM llm_slots").fetchone()[0]
+            slot_id = None
+            if in_flight < limit:
+                slot_id = uuid.uuid4().hex
+                conn.execute(
+                    "INSERT INTO llm_slots (id, expires_at) VALUES (?, ?)", (slot_id, now + lease)
+                )
+            conn.execute("COMMIT")
+            return slot_id
+        finally:
+            conn.close()
+
+    def renew_slot(self, slot_id, lease, now):
+        conn = self._connect()
+        try:
+            cursor = conn.execute(
+                "UPDATE llm_slots SET expires_at = ? WHERE id = ?", (now + lease, slot_id)
+            )
+            return cursor.rowcount == 1
+        finally:
+            conn.close()
+
+    def release_slot(self, slot_id):
+        conn = self._connect()
+        try:
+            conn.execute("DELETE FROM llm_slots WHERE id = ?", (slot_id,))
+        finally:
+            conn.close()
+
+
+class AdmissionController:
+    """Aplica os limites; a fila de espera é local ao worker e limitada
+
+    A vaga tem lease curto (slot_lease) renovado enquanto a chamada está em andamento: um
+    pipeline lento (várias tentativas da IA) não perde a vaga, e a de um worker que morreu
+    é recuperada em até slot_lease segundos
+    """
+
+    def __init__(self, backend, rate_capacity=10, rate_per_minute=6, max_concurrent=4,
+                 max_queue=8, max_wait=10.0, slot_lease=30.0, poll_interval=0.1):
+        self.backend = backend
+        self.rate_capacity = rate_capacity
+        self.refill_per_sec = rate_per_minute / 60.0
+        self.max_concurrent = max_concurrent
+        self.max_queue = max_queue
+        self.max_wait = max_wait
+        self.slot_lease = slot_lease
+        self.poll_interval = poll_interval
+        self._waiting = 0
+        self._lock = threading.Lock()
+
+    def check_rate(self, user_id, scope):
+        """0 se admitido, senão segundos até liberar"""
+        return self.backend.take_token(
+            f"{scope}:{user_id}", self.rate_capacity, self.refill_per_sec, time.time()
+        )
+
+    def refund(self, user_id, scope):
+        self.backend.refund_token(f"{scope}:{user_id}", self.rate_capacity)
+
+    def acquire(self):
+        """Reserva uma vaga global; retorna slot_id ou None (fila cheia/tempo esgotado)"""
+        slot_id = self.backend.acquire_slot(self.max_concurrent, self.slot_lease, time.time())
+        if slot_id:
+            return slot_id
+
+        with self._lock:
+            if self._waiting >= self.max_queue:
+                return None
+            self._waiting += 1
+        try:
+            deadline = time.monotonic() + self.max_wait
+            while time.monotonic() < deadline:
+                time.sleep(self.poll_interval)
+                slot_id = self.backend.acquire_slot(self.max_concurrent, self.slot_lease, time.time())
+                if slot_id:
+                    return slot_id
+            return None
+        finally:
+            with self._lock:
+                self._waiting -= 1
+
+    def keep_alive(self, slot_id, stop):
+        """Renova a vaga a cada terço do lease até stop ser sinalizado"""
+        while not stop.wait(self.slot_lease / 3):
+            if not self.backend.renew_slot(slot_id, self.slot_lease, time.time()):
+                print(f"⚠️ Vaga da IA expirou antes da renovação ({slot_id})")
+                return
+
+    def release(self, slot_id):
+        self.backend.release_slot(slot_id)
+
+
+def init_app(app, backend):
+    """Registra o controlador com os limites de app.config"""
+    app.extensions['admission'] = AdmissionController(
+        backend,
+        rate_capacity=app.config.get('LLM_RATE_CAPACITY', 10),
+        rate_per_minute=app.config.get('LLM_RATE_PER_MINUTE', 6),
+        max_concurrent=app.config.get('LLM_MAX_CONCURRENT', 4),
+        max_queue=app.config.get('LLM_MAX_QUEUE', 8),
+        max_wait=app.config.get('LLM_MAX_WAIT', 10.0)
+    )
+
+
+class AdmissionRejected(Exception):
+    """Requisição recusada pelo controle de admissão"""
+
+    def __init__(self, message, retry_after):
+        super().__init__(message)
+        self.message = message
+        self.retry_after = max(1, math.ceil(retry_after))
+
+
+@contextmanager
+def admitted(scope):
+    """Consome um token do usuário e reserva uma vaga global durante o bloco
+
+    Usar só no caminho que de fato chama a IA (ex.: o líder do single-flight), para que
+    repetições reaproveitadas não gastem token nem ocupem vaga. Levanta AdmissionRejected
+    """
+    controller = current_app.extensions.get('admission')
+    if controller is None:
+        yield
+        return
+
+    wait = controller.check_rate(current_user.id, scope)
+    if wait > 0:
+        print(f"⛔ Limite por usuário atingido ({scope}, usuário {current_user.id})")
+        raise AdmissionRejected("Muitas requisições. Aguarde um pouco e tente de novo.", wait)
+
+    slot_id = controller.acquire()
+    if slot_id is None:
+        # Sem vaga a requisição não foi atendida: o token volta para o usuário
+        controller.refund(current_user.id, scope)
+        print(f"⛔ Fila da IA cheia ({scope})")
+        raise AdmissionRejected("Estamos com muita demanda agora. Tente de novo em instantes.",
+                                controller.max_wait)
+    stop = threading.Event()
+    threading.Thread(target=controller.keep_alive, args=(slot_id, stop), daemon=True).start()
+    try:
+        yield
+    finally:
+        stop.set()
+        controller.release(slot_id)
+
+
+def too_many(error):
+    """Resposta JSON 429 com Retry-After"""
+    response = jsonify({"error": error.message, "retry_after": error.retry_after})
+    response.status_code = 429
+    response.headers['Retry-After'] = str(error.retry_after)
+    return response
@@ -3,6 +3,7 @@ Utilitários para IA (Gemini)
 """
 import google.generativeai as genai
 import json
+import re
 
 
 SYSTEM_PROMPT = """
@@ -51,69 +52,161 @@ def generate_ai_response(conversation_history, max_retries=3):
     return None
 
 
-def generate_report_text(calculation_results, max_retries=2):
-    """Gera texto narrativo do relatório"""
-    report_prompt = f"""
-    Você é a CAROL. Crie um relatório COMPLETO e BEM FORMATADO sobre pegada de carbono.
-
-    Dados (kg CO2e/mês): {json.dumps(calculation_results, ensure_ascii=False, indent=2)}
-
-    ESTRUTURA EXATA (copie essa estrutura):
-
-    ## Seu Relatório de Pegada de Carbono 🌱
-
-    Olá! Aqui está sua análise completa de emissões. Vamos construir um futuro mais verde juntos! 💚
-
-    ### Resultado Total
-
-    Total mensal: {calculation_results['total_kg_co2e']:.2f} kg CO2e/mês = {calculation_results['total_kg_co2e'] * 12:.2f} kg CO2e/ano
-
-    ### Análise por Categoria
-
-    [Identifique a categoria de MAIOR impacto (transporte, energia ou gás) e explique em 2-3 frases]
-
-    ### Dicas para Redução
-
-    1. **[Nome da Dica]**: [Descrição prática e específica em 1-2 linhas]
-
-    2. **[Nome da Dica]**: [Descrição prática e específica em 1-2 linhas]
-
-    3. **[Nome da Dica]**: [Descrição prática e específica em 1-2 linhas]
-
-    ### Como Compensar sua Pegada 💚
-
-    Compensar sua pegada é investir no planeta! Apoie projetos de reflorestamento e ajude a neutralizar suas emissões.
-
-    **Créditos Necessários:**
-    - Mensal: {calculation_results['total_kg_co2e']:.2f} kg CO2e
-    - Anual: {calculation_results['total_kg_co2e'] * 12:.2f} kg CO2e
-    - Árvores: {int(calculation_results['total_kg_co2e'] * 12 / 22)} por ano
-
-    **Organizações:**
+def format_uncertainty(calculation_results):
+    """Linha com a faixa provável (p5-p95) do total, quando calculada"""
+    bands = calculation_results.get('uncertainty')
+    if not bands:
+        return ""
+    total = bands['total']
+    return (f"Faixa provável (90%): {total['p5']:.2f} a {total['p95']:.2f} kg CO2e/mês "
+            f"(mediana {total['p50']:.2f})")
+
+
+CATEGORY_NAMES = {
+    'transporte': 'Transporte',
+    'energia_eletrica': 'Energia Elétrica',
+    'gas_cozinha': 'Gás de Cozinha'
+}
+
+# (nome, R$/ton mínimo, R$/ton máximo)
+OFFSET_ORGANIZATIONS = [
+    ("SOS Mata Atlântica", 30, 50),
+    ("Iniciativa Verde", 40, 60),
+    ("Moss.Earth", 50, 80),
+]
+OFFSET_COST_RANGE = (40, 60)  # R$/ton usado na estimativa de custo
+KG_CO2E_POR_ARVORE_ANO = 22
+
+DEFAULT_TIPS = {
+    'transporte': [
+        ("Transporte coletivo", "Troque alguns trajetos de carro por ônibus, metrô ou carona."),
+        ("Combustível", "Se o carro for flex, prefira etanol: emite bem menos que gasolina."),
+    ],
+    'energia_eletrica': [
+        ("Standby", "Desligue da tomada aparelhos que ficam em standby."),
+        ("Iluminação", "Use lâmpadas LED e aproveite a luz natural."),
+    ],
+    'gas_cozinha': [
+        ("Panela de pressão", "Use panela de pressão e tampe as panelas para cozinhar mais rápido."),
+        ("Chama certa", "Ajuste a chama ao tamanho da panela para não desperdiçar gás."),
+    ],
+}
+
+
+def render_report(calculation_results, analysis, tips):
+    """Monta o relatório: seções fixas calculadas aqui, prosa variável recebida pronta"""
+    total = calculation_results['total_kg_co2e']
+    annual = total * 12
+    cost_min, cost_max = OFFSET_COST_RANGE
+    uncertainty_line = format_uncertainty(calculation_results)
+    
+    lines = [
+        "## Seu Relatório de Pegada de Carbono 🌱",
+        "",
+        "Olá! Aqui está sua análise completa de emissões. Vamos construir um futuro mais verde juntos! 💚",
+        "",
+        "### Resultado Total",
+        "",
+        f"Total mensal: {total:.2f} kg CO2e/mês = {annual:.2f} kg CO2e/ano",
+    ]
+    if uncertainty_line:
+        lines += ["", uncertainty_line]
+    
+    lines += ["", "### Análise por Categoria", "", analysis.strip(), "", "### Dicas para Redução", ""]
+    for i, (title, description) in enumerate(tips, 1):
+        lines += [f"{i}. **{title.strip()}**: {description.strip()}", ""]
+    
+    lines += [
+        "### Como Compensar sua Pegada 💚",
+        "",
+        "Compensar sua pegada é investir no planeta! Apoie projetos de reflorestamento e ajude a neutralizar suas emissões.",
+        "",
+        "**Créditos Necessários:**",
+        f"- Mensal: {total:.2f} kg CO2e",
+        f"- Anual: {annual:.2f} kg CO2e",
+        f"- Árvores: {int(annual / KG_CO2E_POR_ARVORE_ANO)} por ano",
+        "",
+        "**Organizações:**",
+        "",
+    ]
+    lines += [f"{i}. {name} (R$ {low}-{high}/ton)" for i, (name, low, high) in enumerate(OFFSET_ORGANIZATIONS, 1)]
+    lines += [
+        "",
+        "**Custo estimado:**",
+        f"- Mensal: R$ {total / 1000 * cost_min:.2f} a R$ {total / 1000 * cost_max:.2f}",
+        f"- Anual: R$ {annual / 1000 * cost_min:.2f} a R$ {annual / 1000 * cost_max:.2f}",
+        "",
+        "Cada ação conta! Escolha uma organização e plante um futuro mais verde hoje mesmo. 🌱",
+    ]
+    return "\n".join(lines)
+
+
+def default_prose(calculation_results):
+    """Análise e dicas locais, usadas quando a IA falha"""
+    details = calculation_results['details_kg_co2e']
+    total = calculation_results['total_kg_co2e']
+    ordered = sorted(details.items(), key=lambda x: x[1], reverse=True)
+    max_cat, max_value = ordered[0]
+    share = max_value / total * 100 if total else 0
+    
+    analysis = (f"Sua maior fonte de emissões é **{CATEGORY_NAMES[max_cat]}**, com "
+                f"{max_value:.2f} kg CO2e por mês ({share:.0f}% do total). "
+                f"É nessa categoria que pequenas mudanças trazem o maior resultado.")
+    
+    tips = DEFAULT_TIPS[max_cat] + DEFAULT_TIPS[ordered[1][0]][:1]
+    return analysis, tips
 
-    1. SOS Mata Atlântica (R$ 30-50/ton)
-    2. Iniciativa Verde (R$ 40-60/ton)
-    3. Moss.Earth (R$ 50-80/ton)
 
-    **Custo estimado:**
-    - Mensal: R$ {(calculation_results['total_kg_co2e'] / 1000) * 40:.2f} a R$ {(calculation_results['total_kg_co2e'] / 1000) * 60:.2f}
-    - Anual: R$ {(calculation_results['total_kg_co2e'] * 12 / 1000) * 40:.2f} a R$ {(calculation_results['total_kg_co2e'] * 12 / 1000) * 60:.2f}
+def parse_report_prose(text):
+    """Valida a resposta estruturada da IA: {"analise": str, "dicas": [{"titulo", "descricao"}] x3}"""
+    clean = text.strip()
+    if clean.startswith('```'):
+        clean = re.sub(r'```(?:json)?\s*', '', clean).strip('`').strip()
+    data = json.loads(clean)
+    
+    analysis = str(data['analise']).strip()
+    tips = [(str(tip['titulo']).strip(), str(tip['descricao']).strip()) for tip in data['dicas']]
+    if not analysis or len(tips) < 3 or not all(title and desc for title, desc in tips):
+        raise ValueError("Resposta incompleta")
+    return analysis, tips[:3]
 
-    Cada ação conta! Escolha uma organização e plante um futuro mais verde hoje mesmo. 🌱
 
-    REGRAS IMPORTANTES:
-    - COPIE a estrutura EXATAMENTE como mostrada
-    - Use ## para título principal e ### para subtítulos
-    - Use **negrito** apenas nos nomes das dicas
-    - Máximo 350 palavras
-    - Tom brasileiro, amigável e motivador
-    - Use APENAS esses emojis: 🌱 💚 🌳
+def generate_report_text(calculation_results, max_retries=2):
+    """Gera texto narrativo do relatório (a IA escreve só a análise e as dicas)"""
+    details = calculation_results['details_kg_co2e']
+    prose_prompt = f"""
+    Você é a CAROL, especialista brasileira em sustentabilidade.
+
+    Emissões mensais do usuário (kg CO2e/mês):
+    {json.dumps({CATEGORY_NAMES[k]: v for k, v in details.items()}, ensure_ascii=False)}
+    Total: {calculation_results['total_kg_co2e']:.2f}
+
+    Responda APENAS com JSON neste formato:
+    {{
+        "analise": "2-3 frases sobre a categoria de MAIOR impacto",
+        "dicas": [
+            {{"titulo": "Nome curto da dica", "descricao": "Descrição prática em 1-2 linhas"}},
+            {{"titulo": "...", "descricao": "..."}},
+            {{"titulo": "...", "descricao": "..."}}
+        ]
+    }}
+
+    Regras: exatamente 3 dicas, focadas nas categorias de maior impacto; tom brasileiro,
+    amigável e motivador; sem markdown; não repita números além dos informados.
     """
     
     for attempt in range(1, max_retries + 1):
         try:
             model = genai.GenerativeModel('gemini-2.0-flash-exp')
-            text = model.generate_content(report_prompt).text.strip()
+            response = model.generate_content(
+                prose_prompt,
+                generation_config={
+                    'response_mime_type': 'application/json',
+                    'max_output_tokens': 400
+                }
+            )
+            analysis, tips = parse_report_prose(response.text)
+            text = render_report(calculation_results, analysis, tips)
             print(f"✅ Relatório gerado ({len(text)} caracteres)")
             return text
         except Exception as e:
@@ -126,26 +219,5 @@ def generate_report_text(calculation_results, max_retries=2):
 
 
 def generate_simple_report(calculation_results):
-    """Relatório fallback simples"""
-    total = calculation_results['total_kg_co2e']
-    details = calculation_results['details_kg_co2e']
-    max_cat = max(details.items(), key=lambda x: x[1])
-    
-    names = {
-        'transporte': 'Transporte',
-        'energia_eletrica': 'Energia Elétrica',
-        'gas_cozinha': 'Gás de Cozinha'
-    }
-    
-    return f"""## Seu Relatório de Pegada de Carbono 🌱
-
-Sua pegada mensal: **{total:.2f} kg CO2e**
-
-Maior impacto: **{names[max_cat[0]]}** ({max_cat[1]:.2f} kg CO2e)
-
-**Dicas:**
-1. Reduza o consumo na categoria de maior impacto
-2. Adote práticas sustentáveis
-3. Compartilhe com amigos
-
-Continue nessa jornada! 💚"""
+    """Relatório fallback: mesma estrutura, com análise e dicas locais"""
+    return render_report(calculation_results, *default_prose(calculation_results))
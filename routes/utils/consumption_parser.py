@@ -0,0 +1,456 @@
+"""
+Parser de consumo em português (pt-BR)
+Tokenizador compilado de passada única que transforma o texto do usuário em slots
+tipados (km, kWh, botijões, combustível) com um grau de confiança para cada valor
+"""
+import re
+from collections import namedtuple
+
+
+KG_POR_BOTIJAO = 13.0
+
+SLOT_NAMES = ('km_carro', 'tipo_combustivel', 'km_onibus', 'kwh_eletricidade', 'kg_gas_glp')
+
+# value=None com confiança alta significa "confirmado que não tem/não usa"
+Slot = namedtuple('Slot', ['value', 'confidence'])
+
+_TOKEN_RE = re.compile(r"""
+    (?P<number>\d{1,3}(?:\.\d{3})+(?:,\d+)?|\d+(?:[.,]\d+)?)
+  | (?P<word>[^\W\d_]+)
+  | (?P<sep>[!?;\n]|\.(?!\d))
+""", re.VERBOSE)
+
+_NUMBER_RE = re.compile(r'\d{1,3}(?:\.\d{3})+(?:,\d+)?|\d+(?:[.,]\d+)?')
+
+# Palavras reconhecidas -> (tipo, valor)
+_WORDS = {}
+
+
+def _register(kind, value, *words):
+    for word in words:
+        _WORDS[word] = (kind, value)
+
+
+_register('unit', 'km', 'km', 'kms', 'quilometro', 'quilômetro', 'quilometros', 'quilômetros')
+_register('unit', 'kwh', 'kwh', 'kw', 'quilowatt', 'quilowatts')
+_register('unit', 'botijao', 'botijao', 'botijão', 'botijoes', 'botijões', 'botija', 'botijas')
+_register('unit', 'kg', 'kg', 'kgs', 'quilo', 'quilos')
+_register('unit', 'reais', 'reais', 'real')
+_register('mil', 1000.0, 'mil')
+_register('fuel', 'gasolina', 'gasolina')
+_register('fuel', 'etanol', 'etanol', 'alcool', 'álcool')
+_register('fuel', 'diesel', 'diesel')
+_register('context', 'carro', 'carro', 'carros', 'automovel', 'automóvel', 'dirijo', 'rodo')
+_register('context', 'onibus', 'onibus', 'ônibus', 'busão', 'busao', 'metro', 'metrô', 'trem', 'transporte')
+_register('context', 'energia', 'luz', 'energia', 'eletricidade', 'elétrica', 'eletrica')
+_register('context', 'gas', 'gas', 'gás', 'glp')
+_register('negation', True, 'não', 'nao', 'nunca', 'sem', 'nem')
+_register('numword', 0.0, 'zero', 'nenhum', 'nenhuma')
+_register('numword', 0.5, 'meio', 'meia')
+_register('numword', 1.0, 'um', 'uma')
+_register('numword', 2.0, 'dois', 'duas')
+_register('numword', 3.0, 'três', 'tres')
+_register('numword', 4.0, 'quatro')
+_register('numword', 5.0, 'cinco')
+_register('numword', 6.0, 'seis')
+_register('numword', 10.0, 'dez')
+# Período -> fator para converter em valor mensal
+_register('period', 30.0, 'dia', 'dias', 'diario', 'diário', 'diaria', 'diária', 'diariamente')
+_register('period', 52.0 / 12, 'semana', 'semanas', 'semanal', 'semanalmente')
+_register('period', 2.0, 'quinzena', 'quinzenas', 'quinzenal')
+_register('period', 1.0, 'mes', 'mês', 'meses', 'mensal', 'mensalmente')
+_register('period', 1.0 / 12, 'ano', 'anos', 'anual', 'anualmente')
+_register('every', True, 'cada')
+
+# Palavras que ligam o valor ao período: "100 km POR semana", "ao mês", "na semana"
+_PERIOD_LINKS = {'por', 'ao', 'na', 'no', 'pela', 'pelo', 'toda', 'todo', 'de', 'a', 'o', 'uma', 'um'}
+_PERIOD_ADJECTIVES = {'diario', 'diário', 'diaria', 'diária', 'diariamente', 'semanal',
+                      'semanalmente', 'quinzenal', 'mensal', 'mensalmente', 'anual', 'anualmente'}
+
+# A negação só vale para posse/uso: "não tenho carro", "não ando de ônibus", "sem carro".
+# Qualquer outra palavra entre a negação e o assunto ("não uso MUITO o carro") a cancela.
+_NEGATION_VERBS = {
+    'tenho', 'tem', 'temos', 'possuo', 'uso', 'usa', 'usamos', 'utilizo', 'ando', 'anda',
+    'andamos', 'pego', 'pega', 'pegamos', 'compro', 'compra', 'gasto', 'gasta'
+}
+_NEGATION_FILLERS = {'de', 'do', 'da', 'o', 'a', 'os', 'as', 'mais', 'meu', 'minha', 'nenhum', 'nenhuma'}
+
+_CONTEXT_KEYWORDS_RE = re.compile(
+    r'carro|combust[íi]vel|[ôo]nibus|transporte p[úu]blico|kwh|luz|energia|botij|g[áa]s',
+    re.IGNORECASE
+)
+_CONTEXT_BY_PREFIX = {
+    'car': 'carro', 'com': 'carro', 'ôni': 'onibus', 'oni': 'onibus', 'tra': 'onibus',
+    'kwh': 'energia', 'luz': 'energia', 'ene': 'energia', 'bot': 'gas', 'gás': 'gas', 'gas': 'gas'
+}
+
+# Slot de destino para número com unidade "km" ou sem unidade, conforme o contexto
+_KM_SLOT = {'carro': 'km_carro', 'onibus': 'km_onibus'}
+
+# Confiança por origem do valor; abaixo de CONF_HINTED o caminho rápido não é usado
+# (número sem unidade, período não resolvido) e a conversa vai para a IA
+CONF_EXPLICIT = 0.9
+CONF_HINTED = 0.7
+CONF_GUESSED = 0.5
+
+
+def parse_number(text):
+    """Converte numeral pt-BR em float ("1.234,5" -> 1234.5, "2 mil" -> 2000.0)"""
+    if text is None:
+        return None
+    if isinstance(text, (int, float)):
+        return float(text)
+
+    text = str(text).strip().lower()
+    match = _NUMBER_RE.search(text)
+    if match:
+        value = _to_float(match.group(0))
+        if re.match(r'\s*mil\b', text[match.end():]):
+            value *= 1000.0
+        return value
+    if re.search(r'\bmil\b', text):
+        return 1000.0
+    return None
+
+
+def _to_float(raw):
+    """Numeral já isolado pelo tokenizador -> float"""
+    if ',' in raw:
+        return float(raw.replace('.', '').replace(',', '.'))
+    if raw.count('.') > 1 or re.fullmatch(r'\d{1,3}\.\d{3}', raw):
+        return float(raw.replace('.', ''))
+    return float(raw)
+
+
+def context_hint(text):
+    """Último assunto mencionado (ex.: pergunta da assistente) para desambiguar respostas curtas"""
+    hint = None
+    for match in _CONTEXT_KEYWORDS_RE.finditer(text):
+        hint = _CONTEXT_BY_PREFIX.get(match.group(0)[:3].lower(), hint)
+    return hint
+
+
+def parse_text(text, default_context=None, slots=None):
+    """Analisa um texto em uma única passada e atualiza/retorna o dicionário de slots"""
+    if slots is None:
+        slots = {}
+
+    def put(name, value, confidence):
+        current = slots.get(name)
+        if current is None or confidence >= current.confidence:
+            slots[name] = Slot(value, confidence)
+            if isinstance(value, float):
+                touched.append(name)
+
+    def rescale(factor, cap=None):
+        """Aplica o período ao último número (ainda pendente ou já gravado em slots)"""
+        nonlocal pending, pending_km, capped
+        if pending is not None and not pending_word:
+            pending = round(pending * factor, 2)
+        elif pending_km is not None:
+            pending_km = round(pending_km * factor, 2)
+        for name in touched:
+            value, confidence = slots[name]
+            if cap is not None:
+                confidence = min(confidence, cap)
+            slots[name] = Slot(round(value * factor, 2), confidence)
+        touched.clear()
+        capped = capped or cap is not None
+
+    def assign(value, unit, context, confidence):
+        if unit == 'km':
+            slot = _KM_SLOT.get(context)
+            if slot:
+                put(slot, value, confidence)
+                return True
+            return False
+        if unit == 'kwh':
+            put('kwh_eletricidade', value, CONF_EXPLICIT)
+        elif unit == 'botijao':
+            put('kg_gas_glp', value * KG_POR_BOTIJAO, CONF_EXPLICIT)
+        elif unit == 'kg':
+            put('kg_gas_glp', value, confidence if context == 'gas' else CONF_GUESSED)
+        elif unit is None:
+            if context in _KM_SLOT:
+                put(_KM_SLOT[context], value, confidence)
+            elif context == 'energia':
+                put('kwh_eletricidade', value, confidence)
+            elif context == 'gas':
+                kg = value * KG_POR_BOTIJAO if value <= 5 else value
+                put('kg_gas_glp', kg, confidence)
+            else:
+                return False
+        return True
+
+    def negate(value, confidence):
+        if value == 'carro':
+            put('km_carro', None, confidence)
+            put('tipo_combustivel', None, confidence)
+        elif value == 'onibus':
+            put('km_onibus', None, confidence)
+        elif value == 'gas':
+            put('kg_gas_glp', 0.0, confidence)
+
+    context = None          # contexto explícito da frase atual
+    pending = None          # último número ainda sem unidade
+    pending_word = False    # "um", "dois"... só valem seguidos de unidade ("um botijão")
+    pending_km = None       # "300 km" antes de saber se é carro ou ônibus
+    negation = None         # None | 'neg' (logo após "não") | 'verb' ("não tenho", "não uso")
+    negated_context = None  # "não uso ônibus, mas uns 20 km"
+    touched = []            # slots preenchidos pelo último número ("100 km" antes de "por semana")
+    every = None            # "a cada": True, depois o N de "a cada N meses"
+    capped = False          # período não resolvido: confiança limitada a CONF_GUESSED
+    prev = None             # palavra anterior ('value' após número/unidade)
+
+    def close_sentence():
+        if every is not None:
+            # "a cada 2" sem dizer dias/meses: valor sem período conhecido
+            rescale(1.0, CONF_GUESSED)
+        fallback = context or default_context
+        confidence = CONF_EXPLICIT if context else CONF_HINTED
+        if capped:
+            confidence = CONF_GUESSED
+        if pending_km is not None:
+            if negated_context == 'onibus' and fallback is None:
+                put('km_onibus', pending_km, CONF_EXPLICIT)
+            elif not assign(pending_km, 'km', fallback, confidence):
+                # Sem contexto: km sem dono vai para o carro, a menos que ele tenha sido negado
+                car = slots.get('km_carro')
+                target = 'km_onibus' if car and car.value is None else 'km_carro'
+                put(target, pending_km, CONF_GUESSED)
+        if pending is not None and not pending_word:
+            # Número sem unidade ("uns 20", "carro 2019"): guardado, mas sem confiança para o atalho
+            assign(pending, None, fallback, CONF_GUESSED)
+        elif negation is not None and context is None and pending_km is None:
+            # "não uso" respondendo à pergunta da assistente
+            negate(default_context, CONF_HINTED)
+
+    for match in _TOKEN_RE.finditer(text):
+        kind = match.lastgroup
+
+        if kind == 'number':
+            number = _to_float(match.group('number'))
+            negation = None
+            if every is True:
+                every, prev = number, None
+                continue
+            pending = number
+            pending_word = False
+            touched, capped, prev = [], False, 'value'
+            continue
+
+        if kind == 'sep':
+            close_sentence()
+            context, pending, pending_km, negation = None, None, None, None
+            negated_context, every, capped, prev = None, None, False, None
+            touched = []
+            continue
+
+        word = match.group('word').lower()
+        entry = _WORDS.get(word)
+        linked, prev = prev == 'value' or prev in _PERIOD_LINKS, word
+
+        if entry and entry[0] == 'period':
+            if every is not None:
+                rescale(entry[1] / (every if every is not True else 1.0))
+                every = None
+            elif linked or word in _PERIOD_ADJECTIVES:
+                rescale(entry[1])
+            continue
+        if entry and entry[0] == 'every':
+            every = True
+            continue
+
+        if negation is not None and not (entry and entry[0] == 'context'):
+            if negation == 'neg' and word in _NEGATION_VERBS:
+                negation = 'verb'
+                continue
+            if negation == 'verb' and (word in _NEGATION_FILLERS or (entry and entry[0] == 'numword')):
+                continue
+            negation = None
+
+        if entry is None:
+            continue
+        word_kind, value = entry
+
+        if word_kind == 'numword':
+            if every is True:
+                every = value
+                continue
+            pending, pending_word = value, True
+            touched, capped = [], False
+        elif word_kind == 'mil':
+            pending = pending * value if pending is not None else value
+            pending_word = False
+        elif word_kind == 'negation':
+            # "sem" já indica ausência ("sem carro"); "não"/"nunca" precisam do verbo
+            negation = 'verb' if word == 'sem' else 'neg'
+        elif word_kind == 'fuel':
+            put('tipo_combustivel', value, CONF_EXPLICIT)
+            context = 'carro'
+        elif word_kind == 'context':
+            if negation is not None:
+                negate(value, CONF_EXPLICIT if value != 'gas' else CONF_HINTED)
+                negation = None
+                negated_context, context = value, None
+                continue
+            context = value
+            if pending_km is not None and assign(pending_km, 'km', context, CONF_EXPLICIT):
+                pending_km = None
+        elif word_kind == 'unit':
+            if pending is None:
+                continue
+            prev = 'value'
+            if value == 'km' and not assign(pending, 'km', context, CONF_EXPLICIT):
+                pending_km = pending
+            elif value != 'km' and value != 'reais':
+                assign(pending, value, context, CONF_EXPLICIT)
+            pending = None
+
+    close_sentence()
+    return slots
+
+
+def parse_conversation(conversation_history, system_prompt=None):
+    """Analisa as mensagens do usuário usando a pergunta anterior da assistente como contexto
+
+    O prompt de sistema é guardado como mensagem 'user'; passe-o em system_prompt para ignorá-lo.
+    """
+    slots = {}
+    hint = None
+    for msg in conversation_history:
+        text = ' '.join(part for part in msg.get('parts', []) if isinstance(part, str))
+        if system_prompt and text.strip() == system_prompt.strip():
+            continue
+        if msg.get('role') == 'user':
+            parse_text(text, default_context=hint, slots=slots)
+            hint = None
+        else:
+            hint = context_hint(text[-300:])
+    return slots
+
+
+def to_extracted_data(slots, min_confidence=0.0):
+    """Converte slots para o formato usado por calculate_footprint"""
+    data = {}
+    for name in SLOT_NAMES:
+        slot = slots.get(name)
+        data[name] = slot.value if slot and slot.confidence >= min_confidence else None
+    return data
+
+
+def is_complete(slots, min_confidence=CONF_HINTED):
+    """True quando todos os dados necessários foram encontrados com confiança suficiente"""
+    def confident(name):
+        slot = slots.get(name)
+        return slot is not None and slot.confidence >= min_confidence
+
+    car = slots.get('km_carro')
+    car_ok = confident('km_carro') and (car.value is None or confident('tipo_combustivel'))
+    return car_ok and all(confident(name) for name in ('km_onibus', 'kwh_eletricidade', 'kg_gas_glp'))
+
+
+# Casos de referência: texto do usuário -> (dados esperados, caminho rápido pode ser usado)
+GOLDEN_CASES = [
+    ("Tenho carro a gasolina e rodo uns 1.200 km por mês. Uso 40 km de ônibus. "
+     "Minha conta deu 1.234,5 kWh e gasto 1 botijão.",
+     {'km_carro': 1200.0, 'tipo_combustivel': 'gasolina', 'km_onibus': 40.0,
+      'kwh_eletricidade': 1234.5, 'kg_gas_glp': 13.0}, True),
+    ("Não tenho carro, ando 2 mil km/mês de ônibus, 150 kwh e dois botijões",
+     {'km_carro': None, 'tipo_combustivel': None, 'km_onibus': 2000.0,
+      'kwh_eletricidade': 150.0, 'kg_gas_glp': 26.0}, True),
+    ("Meu carro é a etanol, 1,5 mil km. Não uso ônibus. Luz: 200 kWh. Meio botijão",
+     {'km_carro': 1500.0, 'tipo_combustivel': 'etanol', 'km_onibus': None,
+      'kwh_eletricidade': 200.0, 'kg_gas_glp': 6.5}, True),
+    ("Rodo 300km no carro diesel, não ando muito de ônibus mas uns 20 km. 90,5 kwh, 13 kg de gás",
+     {'km_carro': 300.0, 'tipo_combustivel': 'diesel', 'km_onibus': 20.0,
+      'kwh_eletricidade': 90.5, 'kg_gas_glp': 13.0}, False),
+    ("Não sei bem, mas o carro é a álcool e faço 500 quilômetros. 3 botijões. Consumo 180 kwh",
+     {'km_carro': 500.0, 'tipo_combustivel': 'etanol', 'km_onibus': None,
+      'kwh_eletricidade': 180.0, 'kg_gas_glp': 39.0}, False),
+    # "não ... muito" é ressalva, não negação
+    ("não uso muito o carro, uns 200 km",
+     {'km_carro': 200.0, 'tipo_combustivel': None, 'km_onibus': None,
+      'kwh_eletricidade': None, 'kg_gas_glp': None}, False),
+    ("Tenho carro. Não ando de ônibus.",
+     {'km_carro': None, 'tipo_combustivel': None, 'km_onibus': None,
+      'kwh_eletricidade': None, 'kg_gas_glp': None}, False),
+    # Períodos convertidos para o mês: 100 km/semana ~ 433 km; 1 botijão a cada 2 meses = 6,5 kg
+    ("carro a etanol, 100 km por semana. nao ando de onibus. 150 kwh. 1 botijão a cada 2 meses",
+     {'km_carro': 433.33, 'tipo_combustivel': 'etanol', 'km_onibus': None,
+      'kwh_eletricidade': 150.0, 'kg_gas_glp': 6.5}, True),
+    ("Ando 20 km de ônibus por dia, carro 12.000 km por ano a diesel, "
+     "1 botijão a cada 15 dias, 150 kwh/mês",
+     {'km_carro': 1000.0, 'tipo_combustivel': 'diesel', 'km_onibus': 600.0,
+      'kwh_eletricidade': 150.0, 'kg_gas_glp': 26.0}, True),
+    # Número sem unidade (ano do carro) ou período não resolvido: a IA decide
+    ("Tenho um carro 2019 a gasolina. Não pego ônibus. 200 kWh. 1 botijão",
+     {'km_carro': 2019.0, 'tipo_combustivel': 'gasolina', 'km_onibus': None,
+      'kwh_eletricidade': 200.0, 'kg_gas_glp': 13.0}, False),
+    ("Sem carro, 100 km de ônibus, 150 kwh e 1 botijão a cada 2",
+     {'km_carro': None, 'tipo_combustivel': None, 'km_onibus': 100.0,
+      'kwh_eletricidade': 150.0, 'kg_gas_glp': 13.0}, False),
+]
+
+
+def _golden_conversations():
+    """Históricos no formato do app: prompt de sistema como primeira mensagem 'user'"""
+    from routes.utils.ai_helper import SYSTEM_PROMPT
+    history = [
+        {'role': 'user', 'parts': [SYSTEM_PROMPT]},
+        {'role': 'model', 'parts': ["Oi! Eu sou a Carol 🌱 Vamos lá... você tem carro?"]},
+        {'role': 'user', 'parts': ["rodo 500 km de carro. Ando 40 km de ônibus. Gasto 150 kWh."]},
+    ]
+    expected = {'km_carro': 500.0, 'tipo_combustivel': None, 'km_onibus': 40.0,
+                'kwh_eletricidade': 150.0, 'kg_gas_glp': None}
+    # Resposta curta sem unidade a uma pergunta sobre ônibus: valor mensal, mas sem atalho
+    reply = [
+        {'role': 'user', 'parts': ["Não tenho carro, 150 kwh e 1 botijão por mês"]},
+        {'role': 'model', 'parts': ["Beleza! E de ônibus, quantos km você anda?"]},
+        {'role': 'user', 'parts': ["uns 20 por dia"]},
+    ]
+    reply_expected = {'km_carro': None, 'tipo_combustivel': None, 'km_onibus': 600.0,
+                      'kwh_eletricidade': 150.0, 'kg_gas_glp': 13.0}
+    # Sem combustível nem gás o caminho rápido não pode ser usado
+    return [(history, SYSTEM_PROMPT, expected, False), (reply, None, reply_expected, False)]
+
+
+def _run_golden():
+    failures = 0
+    for text, expected, complete in GOLDEN_CASES:
+        slots = parse_text(text)
+        got = to_extracted_data(slots)
+        if got != expected or is_complete(slots) != complete:
+            failures += 1
+            print(f"❌ {text!r}\n   esperado: {expected} (completo={complete})"
+                  f"\n   obtido:   {got} (completo={is_complete(slots)})")
+    conversations = _golden_conversations()
+    for history, system_prompt, expected, complete in conversations:
+        slots = parse_conversation(history, system_prompt=system_prompt)
+        got = to_extracted_data(slots)
+        if got != expected or is_complete(slots) != complete:
+            failures += 1
+            print(f"❌ {history[-1]['parts'][0]!r}\n   esperado: {expected} (completo={complete})"
+                  f"\n   obtido:   {got} (completo={is_complete(slots)})")
+    total = len(GOLDEN_CASES) + len(conversations)
+    print(f"{'✅' if not failures else '❌'} Casos de referência: {total - failures}/{total}")
+    return failures
+
+
+def _run_benchmark(messages=2000, repeat=5):
+    import timeit
+    history = []
+    for i in range(messages):
+        history.append({'role': 'model', 'parts': ["E quantos km você roda de carro por mês?"]})
+        history.append({'role': 'user', 'parts': [GOLDEN_CASES[i % len(GOLDEN_CASES)][0]]})
+    chars = sum(len(msg['parts'][0]) for msg in history)
+    best = min(timeit.repeat(lambda: parse_conversation(history), number=1, repeat=repeat))
+    print(f"⏱️ {messages} mensagens ({chars / 1000:.0f}k caracteres): {best * 1000:.1f} ms "
+          f"({chars / best / 1e6:.1f} M caracteres/s)")
+
+
+if __name__ == '__main__':
+    import sys
+    failed = _run_golden()
+    _run_benchmark()
+    sys.exit(1 if failed else 0)
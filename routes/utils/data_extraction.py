@@ -4,10 +4,22 @@ Utilitários para extração de dados
 import json
 import re
 import google.generativeai as genai
+from routes.utils.consumption_parser import (
+    parse_conversation, parse_number, to_extracted_data, is_complete
+)
+from routes.utils.ai_helper import SYSTEM_PROMPT
+from routes.carbon_calculator import normalize_fuel
 
 
 def extract_data_from_conversation(conversation_history, max_retries=3):
     """Extrai dados da conversa com retry"""
+    # Caminho rápido: parser local resolve sem chamar a IA quando tem todos os dados
+    slots = parse_conversation(conversation_history, system_prompt=SYSTEM_PROMPT)
+    if is_complete(slots):
+        data = to_extracted_data(slots)
+        print(f"⚡ Dados extraídos localmente: {data}")
+        return data
+    
     for attempt in range(1, max_retries + 1):
         try:
             print(f"🔄 Tentativa {attempt} - Extraindo...")
@@ -62,18 +74,16 @@ def sanitize_data(extracted_data):
             continue
         
         if key == 'tipo_combustivel':
-            sanitized[key] = str(value).lower() if value else None
+            sanitized[key] = normalize_fuel(value)
         else:
             try:
-                numeric = re.sub(r'[^\d.]', '', str(value))
-                if numeric:
-                    num = float(numeric)
-                    if key == 'kg_gas_glp' and num <= 5:
-                        sanitized[key] = num * 13.0
-                    else:
-                        sanitized[key] = num
-                else:
+                num = parse_number(value)
+                if num is None:
                     sanitized[key] = None
+                elif key == 'kg_gas_glp' and num <= 5:
+                    sanitized[key] = num * 13.0
+                else:
+                    sanitized[key] = num
             except:
                 sanitized[key] = None
     
@@ -82,44 +92,8 @@ def sanitize_data(extracted_data):
 
 def extract_manually(conversation_history):
     """Extração manual como fallback"""
-    data = {
-        'km_carro': None,
-        'tipo_combustivel': None,
-        'km_onibus': None,
-        'kwh_eletricidade': None,
-        'kg_gas_glp': None
-    }
-    
     try:
-        text = ' '.join([msg['parts'][0] for msg in conversation_history if msg['role'] == 'user'])
-        text_lower = text.lower()
-        
-        # Detectar carro
-        if 'não' in text_lower and 'carro' in text_lower:
-            data['km_carro'] = None
-            data['tipo_combustivel'] = None
-        else:
-            km_match = re.search(r'(\d+)\s*km', text, re.IGNORECASE)
-            if km_match:
-                data['km_carro'] = float(km_match.group(1))
-            
-            if 'gasolina' in text_lower:
-                data['tipo_combustivel'] = 'gasolina'
-            elif 'etanol' in text_lower:
-                data['tipo_combustivel'] = 'etanol'
-            elif 'diesel' in text_lower:
-                data['tipo_combustivel'] = 'diesel'
-        
-        # kWh
-        kwh_match = re.search(r'(\d+)\s*kwh', text, re.IGNORECASE)
-        if kwh_match:
-            data['kwh_eletricidade'] = float(kwh_match.group(1))
-        
-        # Botijões
-        botijao_match = re.search(r'(\d+)\s*botij', text, re.IGNORECASE)
-        if botijao_match:
-            data['kg_gas_glp'] = float(botijao_match.group(1)) * 13.0
-        
+        data = to_extracted_data(parse_conversation(conversation_history, system_prompt=SYSTEM_PROMPT))
         print(f"📋 Extração manual: {data}")
         return data
         
@@ -0,0 +1,83 @@
+"""
+Idempotência e single-flight
+Requisições idênticas simultâneas esperam o resultado da que está em andamento,
+e resultados concluídos são reaproveitados por uma janela curta
+"""
+import hashlib
+import json
+import threading
+import time
+
+from flask import request
+
+
+IDEMPOTENCY_HEADER = 'Idempotency-Key'
+
+
+class _Flight:
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = None
+        self.finished_at = None
+
+
+class SingleFlight:
+    """Registro em memória de execuções por chave"""
+
+    def __init__(self, replay_window=60, wait_timeout=120):
+        self.replay_window = replay_window
+        self.wait_timeout = wait_timeout
+        self._flights = {}
+        self._lock = threading.Lock()
+
+    def _sweep(self, now):
+        expired = [
+            key for key, flight in self._flights.items()
+            if flight.finished_at is not None and now - flight.finished_at > self.replay_window
+        ]
+        for key in expired:
+            del self._flights[key]
+
+    def run(self, key, fn, cacheable=lambda result: True):
+        """Executa fn uma única vez por chave; retorna (resultado, reaproveitado)"""
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                self._sweep(now)
+                flight = self._flights.get(key)
+                leader = flight is None
+                if leader:
+                    flight = self._flights[key] = _Flight()
+            if leader:
+                break
+
+            # Seguidores nunca executam fn por conta própria: recebem o resultado do líder
+            # (mesmo de falha) ou, se ele levantou exceção, voltam ao registro e um único
+            # novo líder é eleito; se o líder ainda está rodando, continuam esperando
+            if flight.done.wait(self.wait_timeout) and flight.result is not None:
+                return flight.result, True
+
+        result = None
+        try:
+            result = fn()
+            return result, False
+        finally:
+            with self._lock:
+                flight.result = result
+                if result is not None and cacheable(result):
+                    flight.finished_at = time.monotonic()
+                else:
+                    self._flights.pop(key, None)
+            flight.done.set()
+
+
+single_flight = SingleFlight()
+
+
+def request_key(user_id, scope, payload):
+    """Usuário + hash da entrada, mais a chave do cliente (header/campo idempotency_key) se houver"""
+    client_key = request.headers.get(IDEMPOTENCY_HEADER) or request.form.get('idempotency_key') or ''
+    digest = hashlib.sha256(
+        json.dumps(payload, sort_keys=True, ensure_ascii=False, default=str).encode('utf-8')
+    ).hexdigest()
+    return f"{user_id}:{scope}:{client_key[:200]}:{digest}"
@@ -0,0 +1,226 @@
+"""
+Rankings de equipes
+Agregados por equipe/mês no banco e um índice ordenado em memória, atualizado de forma
+incremental quando relatórios são criados ou deletados
+"""
+import threading
+from bisect import bisect_left, bisect_right, insort
+from datetime import datetime
+
+from sqlalchemy import case, delete, event, func, select, update
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+
+from src.models import db, Report, TeamMonthStats, MemberMonthStats
+
+
+def month_key(moment=None):
+    """Chave 'AAAA-MM' do mês"""
+    return (moment or datetime.utcnow()).strftime('%Y-%m')
+
+
+class RankingIndex:
+    """Lista ordenada (média, user_id) por (equipe, mês), sincronizada pela version do banco
+
+    Alterações são feitas no lugar, sob lock: busca binária O(log n) e uma inserção/remoção
+    na lista (memmove), sem copiar a lista inteira. Leituras também passam pelo lock
+    """
+
+    def __init__(self):
+        self._entries = {}   # (team_id, month) -> [(avg, user_id), ...]
+        self._versions = {}  # (team_id, month) -> version carregada
+        self._lock = threading.Lock()
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._versions.clear()
+
+    def _sync(self, team_id, month):
+        """Recarrega a lista do banco se outro worker alterou o ranking"""
+        key = (team_id, month)
+        stats = db.session.get(TeamMonthStats, key)
+        version = stats.version if stats else 0
+
+        with self._lock:
+            if self._versions.get(key) == version:
+                return
+
+        rows = db.session.query(MemberMonthStats.avg_kg_co2e, MemberMonthStats.user_id).filter_by(
+            team_id=team_id, month=month
+        ).order_by(MemberMonthStats.avg_kg_co2e, MemberMonthStats.user_id).all()
+        entries = [(avg, user_id) for avg, user_id in rows]
+
+        with self._lock:
+            self._entries[key] = entries
+            self._versions[key] = version
+
+    def page(self, team_id, month, start, stop):
+        """(total de membros, entradas[start:stop])"""
+        self._sync(team_id, month)
+        with self._lock:
+            entries = self._entries.get((team_id, month), [])
+            return len(entries), entries[start:stop]
+
+    def position(self, team_id, month, entry):
+        """(posição de entry, membros com média maior, total de membros)"""
+        self._sync(team_id, month)
+        with self._lock:
+            entries = self._entries.get((team_id, month), [])
+            higher = len(entries) - bisect_right(entries, (entry[0], float('inf')))
+            return bisect_left(entries, entry) + 1, higher, len(entries)
+
+    def apply(self, team_id, month, old_entry, new_entry, version):
+        """Aplica uma alteração já gravada; só é incremental se o cache está na versão anterior"""
+        key = (team_id, month)
+        with self._lock:
+            if self._versions.get(key) != version - 1:
+                self._versions.pop(key, None)
+                self._entries.pop(key, None)
+                return
+            entries = self._entries[key]
+            if old_entry is not None:
+                i = bisect_left(entries, old_entry)
+                if i < len(entries) and entries[i] == old_entry:
+                    del entries[i]
+            if new_entry is not None:
+                insort(entries, new_entry)
+            self._versions[key] = version
+
+
+ranking_index = RankingIndex()
+
+
+def _pending_updates():
+    return db.session.info.setdefault('ranking_updates', [])
+
+
+def _change_member(team_id, user_id, month, delta_sum, delta_count):
+    """Atualiza agregados de membro e equipe com incrementos no SQL (sem ler-modificar-gravar)"""
+    db.session.execute(sqlite_insert(TeamMonthStats).values(
+        team_id=team_id, month=month, member_count=0, report_count=0, sum_kg_co2e=0.0, version=0
+    ).on_conflict_do_nothing())
+    created = db.session.execute(sqlite_insert(MemberMonthStats).values(
+        team_id=team_id, user_id=user_id, month=month,
+        report_count=0, sum_kg_co2e=0.0, avg_kg_co2e=0.0
+    ).on_conflict_do_nothing()).rowcount == 1
+
+    # Os INSERTs acima já seguram a trava de escrita do SQLite: a média lida não muda até o commit
+    member_filter = (MemberMonthStats.team_id == team_id, MemberMonthStats.user_id == user_id,
+                     MemberMonthStats.month == month)
+    old_entry = None
+    if not created:
+        old_avg = db.session.execute(
+            select(MemberMonthStats.avg_kg_co2e).where(*member_filter)
+        ).scalar_one()
+        old_entry = (old_avg, user_id)
+
+    new_count = MemberMonthStats.report_count + delta_count
+    new_sum = MemberMonthStats.sum_kg_co2e + delta_sum
+    avg, count = db.session.execute(
+        update(MemberMonthStats).where(*member_filter).values(
+            report_count=new_count,
+            sum_kg_co2e=new_sum,
+            avg_kg_co2e=case((new_count > 0, func.round(new_sum / new_count, 2)), else_=0.0)
+        ).returning(MemberMonthStats.avg_kg_co2e, MemberMonthStats.report_count)
+    ).one()
+
+    member_delta = 1 if created else 0
+    new_entry = None
+    if count <= 0:
+        db.session.execute(delete(MemberMonthStats).where(*member_filter))
+        member_delta -= 1
+    else:
+        new_entry = (avg, user_id)
+
+    version = db.session.execute(
+        update(TeamMonthStats).where(
+            TeamMonthStats.team_id == team_id, TeamMonthStats.month == month
+        ).values(
+            member_count=TeamMonthStats.member_count + member_delta,
+            report_count=TeamMonthStats.report_count + delta_count,
+            sum_kg_co2e=TeamMonthStats.sum_kg_co2e + delta_sum,
+            version=TeamMonthStats.version + 1
+        ).returning(TeamMonthStats.version)
+    ).scalar_one()
+
+    _pending_updates().append((team_id, month, old_entry, new_entry, version))
+
+
+def record_report(report, user):
+    """Soma um relatório novo aos agregados da equipe do usuário"""
+    if user.team_id is None:
+        return
+    _change_member(user.team_id, user.id, month_key(report.created_at),
+                   report.total_kg_co2e, 1)
+
+
+def remove_report(report, user):
+    """Retira um relatório deletado dos agregados da equipe do usuário"""
+    if user.team_id is None:
+        return
+    month = month_key(report.created_at)
+    if db.session.get(MemberMonthStats, (user.team_id, user.id, month)) is None:
+        return
+    _change_member(user.team_id, user.id, month, -report.total_kg_co2e, -1)
+
+
+def move_user(user, new_team_id):
+    """Transfere os agregados do usuário para outra equipe"""
+    reports = Report.query.with_entities(Report.created_at, Report.total_kg_co2e).filter_by(
+        user_id=user.id
+    ).all()
+    per_month = {}
+    for created_at, total in reports:
+        month = month_key(created_at)
+        current = per_month.get(month, (0.0, 0))
+        per_month[month] = (current[0] + total, current[1] + 1)
+
+    for month, (total, count) in per_month.items():
+        member = None
+        if user.team_id is not None:
+            member = db.session.get(MemberMonthStats, (user.team_id, user.id, month))
+        if member is not None:
+            _change_member(user.team_id, user.id, month, -member.sum_kg_co2e, -member.report_count)
+        if new_team_id is not None:
+            _change_member(new_team_id, user.id, month, total, count)
+
+    user.team_id = new_team_id
+
+
+@event.listens_for(db.session, 'after_commit')
+def _apply_ranking_updates(session):
+    """Repassa ao índice em memória as alterações já confirmadas no banco"""
+    for change in session.info.pop('ranking_updates', []):
+        ranking_index.apply(*change)
+
+
+@event.listens_for(db.session, 'after_rollback')
+def _discard_ranking_updates(session):
+    session.info.pop('ranking_updates', None)
+
+
+def leaderboard_page(team_id, month, page=1, per_page=20):
+    """Página do ranking (menor pegada primeiro): O(página) sobre a lista ordenada"""
+    start = (page - 1) * per_page
+    total, entries = ranking_index.page(team_id, month, start, start + per_page)
+    return total, [
+        (start + i + 1, avg, user_id) for i, (avg, user_id) in enumerate(entries)
+    ]
+
+
+def member_rank(team_id, month, user_id):
+    """Posição e percentil de um membro: O(log n) por busca binária"""
+    member = db.session.get(MemberMonthStats, (team_id, user_id, month))
+    if member is None:
+        return None
+
+    position, higher, total = ranking_index.position(
+        team_id, month, (member.avg_kg_co2e, user_id)
+    )
+    return {
+        'rank': position,
+        'member_count': total,
+        'avg_kg_co2e': member.avg_kg_co2e,
+        # Percentual de membros com pegada maior que a sua
+        'percentile': round(higher / total * 100, 1) if total else 0.0
+    }
@@ -0,0 +1,214 @@
+"""
+Sessões no servidor
+O cookie guarda apenas o id assinado; os dados ficam em SQLite (ou memória nos testes)
+"""
+import json
+import secrets
+import sqlite3
+import threading
+import time
+from contextlib import contextmanager
+from datetime import timedelta
+
+from flask import session as current_session
+from flask.sessions import SessionInterface, SessionMixin
+from flask_login import user_logged_in, user_logged_out
+from itsdangerous import BadSignature, Signer
+from werkzeug.datastructures import CallbackDict
+
+
+class ServerSideSession(CallbackDict, SessionMixin):
+    """Sessão cujo conteúdo fica no servidor"""
+
+    def __init__(self, initial=None, sid=None, new=False):
+        def on_update(self):
+            self.modified = True
+
+        super().__init__(initial, on_update)
+        self.sid = sid
+        self.new = new
+        self.modified = False
+        self.previous_sid = None
+
+    def regenerate(self):
+        """Troca o id da sessão (login/logout), descartando o anterior no próximo save"""
+        if not self.new and self.previous_sid is None:
+            self.previous_sid = self.sid
+        self.sid = secrets.token_urlsafe(32)
+        self.modified = True
+
+
+class MemorySessionBackend:
+    """Backend em memória (testes e desenvolvimento)"""
+
+    def __init__(self):
+        self._data = {}
+        self._lock = threading.Lock()
+
+    def load(self, sid):
+        with self._lock:
+            item = self._data.get(sid)
+            if not item:
+                return None
+            payload, expires_at = item
+            if expires_at < time.time():
+                del self._data[sid]
+                return None
+            return json.loads(payload)
+
+    def save(self, sid, data, expires_at):
+        with self._lock:
+            self._data[sid] = (json.dumps(data), expires_at)
+
+    def delete(self, sid):
+        with self._lock:
+            self._data.pop(sid, None)
+
+    def sweep(self):
+        now = time.time()
+        with self._lock:
+            expired = [sid for sid, (_, exp) in self._data.items() if exp < now]
+            for sid in expired:
+                del self._data[sid]
+        return len(expired)
+
+
+class SqliteSessionBackend:
+    """Backend em tabela SQLite com limpeza periódica de sessões expiradas"""
+
+    def __init__(self, path, sweep_interval=300):
+        self.path = path
+        self.sweep_interval = sweep_interval
+        self._last_sweep = 0.0
+        self._lock = threading.Lock()
+        with self._connect() as conn:
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS server_sessions ("
+                " id TEXT PRIMARY KEY,"
+                " data TEXT NOT NULL,"
+                " expires_at REAL NOT NULL)"
+            )
+            conn.execute(
+                "CREATE INDEX IF NOT EXISTS ix_server_sessions_expires_at"
+                " ON server_sessions (expires_at)"
+            )
+
+    @contextmanager
+    def _connect(self):
+        """Transação curta; a conexão é fechada ao final (o with do sqlite3 não fecha)"""
+        conn = sqlite3.connect(self.path, timeout=10)
+        try:
+            with conn:
+                yield conn
+        finally:
+            conn.close()
+
+    def _maybe_sweep(self):
+        now = time.time()
+        with self._lock:
+            if now - self._last_sweep < self.sweep_interval:
+                return
+            self._last_sweep = now
+        self.sweep()
+
+    def load(self, sid):
+        self._maybe_sweep()
+        with self._connect() as conn:
+            row = conn.execute(
+                "SELECT data FROM server_sessions WHERE id = ? AND expires_at >= ?",
+                (sid, time.time())
+            ).fetchone()
+        return json.loads(row[0]) if row else None
+
+    def save(self, sid, data, expires_at):
+        with self._connect() as conn:
+            conn.execute(
+                "INSERT OR REPLACE INTO server_sessions (id, data, expires_at) VALUES (?, ?, ?)",
+                (sid, json.dumps(data), expires_at)
+            )
+
+    def delete(self, sid):
+        with self._connect() as conn:
+            conn.execute("DELETE FROM server_sessions WHERE id = ?", (sid,))
+
+    def sweep(self):
+        with self._connect() as conn:
+            cursor = conn.execute(
+                "DELETE FROM server_sessions WHERE expires_at < ?", (time.time(),)
+            )
+        return cursor.rowcount
+
+
+class ServerSideSessionInterface(SessionInterface):
+    """SessionInterface do Flask que usa um backend no servidor"""
+
+    salt = 'server-side-session'
+
+    def __init__(self, backend, lifetime=timedelta(days=7)):
+        self.backend = backend
+        self.lifetime = lifetime
+
+    def _signer(self, app):
+        return Signer(app.secret_key, salt=self.salt)
+
+    def _new_session(self):
+        return ServerSideSession(sid=secrets.token_urlsafe(32), new=True)
+
+    def open_session(self, app, request):
+        cookie = request.cookies.get(self.get_cookie_name(app))
+        if not cookie:
+            return self._new_session()
+
+        try:
+            sid = self._signer(app).unsign(cookie).decode()
+        except BadSignature:
+            return self._new_session()
+
+        data = self.backend.load(sid)
+        if data is None:
+            return self._new_session()
+        return ServerSideSession(data, sid=sid)
+
+    def save_session(self, app, session, response):
+        name = self.get_cookie_name(app)
+        domain = self.get_cookie_domain(app)
+        path = self.get_cookie_path(app)
+
+        if session.previous_sid:
+            self.backend.delete(session.previous_sid)
+            session.previous_sid = None
+
+        if not session:
+            if session.modified and not session.new:
+                self.backend.delete(session.sid)
+                response.delete_cookie(name, domain=domain, path=path)
+            return
+
+        if not (session.modified or self.should_set_cookie(app, session)):
+            return
+
+        expires_at = time.time() + self.lifetime.total_seconds()
+        self.backend.save(session.sid, dict(session), expires_at)
+
+        response.set_cookie(
+            name,
+            self._signer(app).sign(session.sid).decode(),
+            expires=self.get_expiration_time(app, session),
+            httponly=self.get_cookie_httponly(app),
+            domain=domain,
+            path=path,
+            secure=self.get_cookie_secure(app),
+            samesite=self.get_cookie_samesite(app)
+        )
+
+
+def _regenerate_session_id(sender, **kwargs):
+    if isinstance(current_session, ServerSideSession):
+        current_session.regenerate()
+
+
+def init_app(app, backend):
+    """Instala a sessão no servidor e troca o id da sessão a cada login/logout (evita fixação)"""
+    app.session_interface = ServerSideSessionInterface(backend)
+    user_logged_in.connect(_regenerate_session_id, app)
+    user_logged_out.connect(_regenerate_session_id, app)
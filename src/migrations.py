@@ -0,0 +1,86 @@
+"""
+Migrações leves do SQLite
+db.create_all() cria tabelas novas, mas não altera tabelas que já existem
+"""
+from sqlalchemy import inspect, text
+from src.models import compress_text, NARRATIVE_CODEC
+
+# Colunas adicionadas depois da criação das tabelas: tabela -> {coluna: DDL}
+ADDED_COLUMNS = {
+    'users': {
+        'team_id': 'INTEGER REFERENCES teams(id)',
+    },
+    'reports': {
+        'uncertainty_json': 'TEXT',
+    },
+    'organizations': {
+        'owner_id': 'INTEGER REFERENCES users(id)',
+    },
+    'teams': {
+        'invite_code': 'VARCHAR(32)',
+    },
+}
+
+
+def run_migrations(db):
+    """Adiciona colunas que faltam em bancos criados por versões anteriores"""
+    inspector = inspect(db.engine)
+    tables = set(inspector.get_table_names())
+    
+    for table, columns in ADDED_COLUMNS.items():
+        if table not in tables:
+            continue
+        existing = {col['name'] for col in inspector.get_columns(table)}
+        for name, ddl in columns.items():
+            if name not in existing:
+                db.session.execute(text(f'ALTER TABLE {table} ADD COLUMN {name} {ddl}'))
+                print(f"✅ Migração: coluna {table}.{name} adicionada")
+    
+    db.session.commit()
+    
+    if 'reports' in tables:
+        migrate_narratives(db)
+
+
+def migrate_narratives(db, chunk_size=500):
+    """Move reports.narrative_report (texto inline) para report_narratives comprimido, em lotes"""
+    columns = {col['name'] for col in inspect(db.engine).get_columns('reports')}
+    if 'narrative_report' not in columns:
+        return
+    
+    moved = 0
+    while True:
+        rows = db.session.execute(text(
+            'SELECT id, narrative_report FROM reports '
+            'WHERE narrative_report IS NOT NULL ORDER BY id LIMIT :limit'
+        ), {'limit': chunk_size}).fetchall()
+        if not rows:
+            break
+        
+        db.session.execute(text(
+            'INSERT OR REPLACE INTO report_narratives (report_id, codec, content) '
+            'VALUES (:report_id, :codec, :content)'
+        ), [
+            {'report_id': report_id, 'codec': NARRATIVE_CODEC, 'content': compress_text(narrative)}
+            for report_id, narrative in rows
+        ])
+        db.session.execute(text(
+            'UPDATE reports SET narrative_report = NULL WHERE id IN ({})'.format(
+                ', '.join(str(report_id) for report_id, _ in rows)
+            )
+        ))
+        db.session.commit()
+        moved += len(rows)
+    
+    # DROP COLUMN exige SQLite 3.35+; em versões antigas a coluna fica vazia
+    try:
+        db.session.execute(text('ALTER TABLE reports DROP COLUMN narrative_report'))
+        db.session.commit()
+    except Exception as e:
+        db.session.rollback()
+        print(f"⚠️ Não foi possível remover reports.narrative_report: {e}")
+    
+    with db.engine.connect() as conn:
+        conn.execution_options(isolation_level='AUTOCOMMIT').execute(text('VACUUM'))
+    
+    print(f"✅ Migração: {moved} narrativas movidas para report_narratives")
@@ -4,9 +4,37 @@ from flask_login import UserMixin
 from werkzeug.security import generate_password_hash, check_password_hash
 from datetime import datetime
 import json
+import secrets
+import zlib
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
 
 db = SQLAlchemy()
 
+NARRATIVE_CODEC = 'zstd' if zstandard else 'zlib'
+
+
+def compress_text(text):
+    """Comprime texto com zstd (se instalado) ou zlib"""
+    data = text.encode('utf-8')
+    if NARRATIVE_CODEC == 'zstd':
+        return zstandard.ZstdCompressor(level=9).compress(data)
+    return zlib.compress(data, 9)
+
+
+def decompress_text(blob, codec):
+    if codec == 'zstd':
+        return zstandard.ZstdDecompressor().decompress(blob).decode('utf-8')
+    return zlib.decompress(blob).decode('utf-8')
+
+
+def new_invite_code():
+    """Código de convite aleatório para entrar em uma equipe"""
+    return secrets.token_urlsafe(12)
+
 class User(UserMixin, db.Model):
     __tablename__ = 'users'
     
@@ -15,6 +43,7 @@ class User(UserMixin, db.Model):
     email = db.Column(db.String(120), unique=True, nullable=False)
     password_hash = db.Column(db.String(200), nullable=False)
     profile_picture = db.Column(db.String(200), default='default_avatar.png')  # NOVO
+    team_id = db.Column(db.Integer, db.ForeignKey('teams.id'), nullable=True, index=True)
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
     
     reports = db.relationship('Report', backref='user', lazy=True, cascade='all, delete-orphan')
@@ -29,6 +58,69 @@ class User(UserMixin, db.Model):
         return f'<User {self.username}>'
 
 
+class Organization(db.Model):
+    __tablename__ = 'organizations'
+    
+    id = db.Column(db.Integer, primary_key=True)
+    name = db.Column(db.String(120), unique=True, nullable=False)
+    owner_id = db.Column(db.Integer, db.ForeignKey('users.id'), nullable=True)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    
+    teams = db.relationship('Team', backref='organization', lazy=True, cascade='all, delete-orphan')
+    
+    def to_dict(self):
+        return {'id': self.id, 'name': self.name}
+    
+    def __repr__(self):
+        return f'<Organization {self.name}>'
+
+
+class Team(db.Model):
+    __tablename__ = 'teams'
+    __table_args__ = (db.UniqueConstraint('organization_id', 'name'),)
+    
+    id = db.Column(db.Integer, primary_key=True)
+    organization_id = db.Column(db.Integer, db.ForeignKey('organizations.id'), nullable=False)
+    name = db.Column(db.String(120), nullable=False)
+    invite_code = db.Column(db.String(32), nullable=True, default=new_invite_code)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    
+    members = db.relationship('User', backref='team', lazy=True)
+    
+    def to_dict(self):
+        return {'id': self.id, 'organization_id': self.organization_id, 'name': self.name}
+    
+    def __repr__(self):
+        return f'<Team {self.name}>'
+
+
+class TeamMonthStats(db.Model):
+    """Agregado por equipe e mês; version muda a cada alteração do ranking"""
+    __tablename__ = 'team_month_stats'
+    
+    team_id = db.Column(db.Integer, db.ForeignKey('teams.id'), primary_key=True)
+    month = db.Column(db.String(7), primary_key=True)  # 'AAAA-MM'
+    member_count = db.Column(db.Integer, default=0, nullable=False)
+    report_count = db.Column(db.Integer, default=0, nullable=False)
+    sum_kg_co2e = db.Column(db.Float, default=0.0, nullable=False)
+    version = db.Column(db.Integer, default=0, nullable=False)
+
+
+class MemberMonthStats(db.Model):
+    """Pegada mensal de cada membro (média dos relatórios do mês)"""
+    __tablename__ = 'member_month_stats'
+    __table_args__ = (
+        db.Index('ix_member_month_ranking', 'team_id', 'month', 'avg_kg_co2e', 'user_id'),
+    )
+    
+    team_id = db.Column(db.Integer, db.ForeignKey('teams.id'), primary_key=True)
+    user_id = db.Column(db.Integer, db.ForeignKey('users.id'), primary_key=True)
+    month = db.Column(db.String(7), primary_key=True)
+    report_count = db.Column(db.Integer, default=0, nullable=False)
+    sum_kg_co2e = db.Column(db.Float, default=0.0, nullable=False)
+    avg_kg_co2e = db.Column(db.Float, default=0.0, nullable=False)
+
+
 class Report(db.Model):
     __tablename__ = 'reports'
     
@@ -49,12 +141,37 @@ class Report(db.Model):
     energia_eletrica_kg_co2e = db.Column(db.Float, default=0.0)
     gas_cozinha_kg_co2e = db.Column(db.Float, default=0.0)
     
-    # Relatório narrativo gerado pela IA
-    narrative_report = db.Column(db.Text, nullable=True)
+    # Faixas de incerteza (p5/p50/p95 por categoria e total), em JSON
+    uncertainty_json = db.Column(db.Text, nullable=True)
     
-    def to_dict(self):
+    # Relatório narrativo gerado pela IA (tabela separada, carregado só quando acessado)
+    narrative = db.relationship('ReportNarrative', uselist=False, lazy='select',
+                                cascade='all, delete-orphan')
+    
+    @property
+    def narrative_report(self):
+        return self.narrative.text if self.narrative else None
+    
+    @narrative_report.setter
+    def narrative_report(self, text):
+        if not text:
+            self.narrative = None
+        elif self.narrative:
+            self.narrative.text = text
+        else:
+            self.narrative = ReportNarrative(text=text)
+    
+    @property
+    def uncertainty(self):
+        return json.loads(self.uncertainty_json) if self.uncertainty_json else None
+    
+    @uncertainty.setter
+    def uncertainty(self, bands):
+        self.uncertainty_json = json.dumps(bands) if bands else None
+    
+    def to_dict(self, include_narrative=False):
         """Converte o relatório para dicionário"""
-        return {
+        data = {
             'id': self.id,
             'created_at': self.created_at.strftime('%d/%m/%Y %H:%M'),
             'data_for_dashboard': {
@@ -63,7 +180,8 @@ class Report(db.Model):
                     'energia_eletrica': self.energia_eletrica_kg_co2e,
                     'gas_cozinha': self.gas_cozinha_kg_co2e
                 },
-                'total_kg_co2e': self.total_kg_co2e
+                'total_kg_co2e': self.total_kg_co2e,
+                'uncertainty': self.uncertainty
             },
             'input_data': {
                 'km_carro': self.km_carro,
@@ -71,9 +189,34 @@ class Report(db.Model):
                 'km_onibus': self.km_onibus,
                 'kwh_eletricidade': self.kwh_eletricidade,
                 'kg_gas_glp': self.kg_gas_glp
-            },
-            'narrative_report': self.narrative_report
+            }
         }
+        if include_narrative:
+            data['narrative_report'] = self.narrative_report
+        return data
     
     def __repr__(self):
         return f'<Report {self.id} - {self.total_kg_co2e} kg CO2e>'
+
+
+class ReportNarrative(db.Model):
+    """Texto narrativo comprimido, fora da tabela de relatórios"""
+    __tablename__ = 'report_narratives'
+    
+    report_id = db.Column(db.Integer, db.ForeignKey('reports.id', ondelete='CASCADE'), primary_key=True)
+    codec = db.Column(db.String(8), nullable=False, default=NARRATIVE_CODEC)
+    content = db.Column(db.LargeBinary, nullable=False)
+    
+    def __init__(self, text=None, **kwargs):
+        super().__init__(**kwargs)
+        if text is not None:
+            self.text = text
+    
+    @property
+    def text(self):
+        return decompress_text(self.content, self.codec)
+    
+    @text.setter
+    def text(self, value):
+        self.codec = NARRATIVE_CODEC
+        self.content = compress_text(value)
@@ -59,6 +59,7 @@ function renderChart(reportData) {
     try {
         const chartDetails = reportData.data_for_dashboard.details_kg_co2e;
         const totalEmissions = reportData.data_for_dashboard.total_kg_co2e;
+        const uncertainty = reportData.data_for_dashboard.uncertainty;
         
         const labels = {
             'transporte': 'Transporte',
@@ -66,7 +67,8 @@ function renderChart(reportData) {
             'gas_cozinha': 'Gás de Cozinha'
         };
         
-        const chartLabels = Object.keys(chartDetails).map(key => labels[key] || key);
+        const chartKeys = Object.keys(chartDetails);
+        const chartLabels = chartKeys.map(key => labels[key] || key);
         const chartValues = Object.values(chartDetails);
         
         new Chart(ctx.getContext('2d'), {
@@ -105,7 +107,10 @@ function renderChart(reportData) {
                                 const label = context.label || '';
                                 const value = context.parsed || 0;
                                 const percentage = ((value / totalEmissions) * 100).toFixed(1);
-                                return `${label}: ${value.toFixed(2)} kg CO2e (${percentage}%)`;
+                                const text = `${label}: ${value.toFixed(2)} kg CO2e (${percentage}%)`;
+                                const band = uncertainty && uncertainty[chartKeys[context.dataIndex]];
+                                if (!band) return text;
+                                return [text, `Faixa 90%: ${band.p5.toFixed(2)} a ${band.p95.toFixed(2)} kg`];
                             }
                         }
                     }
@@ -99,38 +99,53 @@ async function startConversation() {
     }
 }
 
+const MAX_RETRY_WAIT_SECONDS = 30;
+
+function retryDelaySeconds(response) {
+    // Retry-After em segundos (429/503); sem o cabeçalho, espera curta antes de repetir
+    const retryAfter = parseInt(response.headers.get('Retry-After'), 10);
+    return Number.isFinite(retryAfter) && retryAfter > 0 ? retryAfter : 1;
+}
+
+function postChatMessage(message) {
+    return fetch('/send_message', {
+        method: 'POST',
+        headers: {'Content-Type': 'application/json'},
+        body: JSON.stringify({text: message})
+    });
+}
+
 async function sendMessage(message) {
     try {
         console.log('💬 Enviando mensagem:', message);
-        const response = await fetch('/send_message', {
-            method: 'POST',
-            headers: {'Content-Type': 'application/json'},
-            body: JSON.stringify({text: message})
-        });
+        let response = await postChatMessage(message);
         
         if (!response.ok) {
             const errorData = await response.json().catch(() => ({}));
             console.error('❌ Erro do servidor:', response.status, errorData);
             
-            console.log('🔄 Tentando novamente...');
-            const retryResponse = await fetch('/send_message', {
-                method: 'POST',
-                headers: {'Content-Type': 'application/json'},
-                body: JSON.stringify({text: message})
-            });
+            const waitSeconds = retryDelaySeconds(response);
+            if (waitSeconds > MAX_RETRY_WAIT_SECONDS) {
+                addMessage(`Estou com muita demanda agora. Tente de novo em ${waitSeconds} segundos. ⏳`, 'bot');
+                return;
+            }
+            if (response.status === 429) {
+                addMessage(`Muitas mensagens seguidas... Respondo em ${waitSeconds} segundos. ⏳`, 'bot');
+            }
+            
+            console.log(`🔄 Tentando novamente em ${waitSeconds}s...`);
+            await new Promise(resolve => setTimeout(resolve, waitSeconds * 1000));
+            response = await postChatMessage(message);
             
-            if (!retryResponse.ok) {
+            if (!response.ok) {
                 throw new Error('Erro após retry');
             }
-            
-            const retryData = await retryResponse.json();
             console.log('✅ Resposta recebida após retry');
-            addMessage(retryData.response, 'bot');
-            return;
+        } else {
+            console.log('✅ Resposta recebida');
         }
         
         const data = await response.json();
-        console.log('✅ Resposta recebida');
         addMessage(data.response, 'bot');
         
     } catch (error) {
@@ -151,6 +166,11 @@ async function generateReport() {
         
         console.log('📋 Resposta do servidor:', response.status);
         
+        if (response.status === 429) {
+            addMessage(`⏳ Estamos com muita demanda agora. Tente gerar o relatório de novo em ${retryDelaySeconds(response)} segundos.`, 'bot');
+            return;
+        }
+        
         if (!response.ok) {
             const errorData = await response.json().catch(() => ({}));
             console.error('❌ Erro ao gerar relatório:', errorData);